@@ -1,13 +1,44 @@
-import json
+import asyncio
 import os
-from typing import Dict, List
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
 from datetime import datetime
 
-import redis
-from database import DbSession
+import httpx
+from context_cache import GeminiContextCache
 from google import genai
 from google.genai import types
-from tools import book_slot, check_availability
+from history import HistoryWindow, RedisHistoryStore
+from limiter import LLMBusyError, LLMLimiter
+from logs import get_logger, log_payload, session_logger
+from metrics import (
+    CARRIED_TOOL_RESULTS,
+    ERRORS,
+    FAST_PATH_ROUTES,
+    GEMINI_CALL_SECONDS,
+    HISTORY_SECONDS,
+    HISTORY_SUMMARIES,
+    TOOL_ITERATIONS,
+    TOOL_SECONDS,
+)
+from redis.asyncio import Redis
+from resilience import CircuitBreaker, ResilientCaller
+from router import FastPathRouter, MessageRouter
+from tools import (
+    book_slot,
+    book_slot_sync,
+    book_slots,
+    book_slots_sync,
+    check_availability,
+    check_availability_range,
+    check_availability_range_sync,
+    check_availability_sync,
+    run_tool,
+)
+from tracing import record_usage, tracer
+
+logger = get_logger("agent")
 
 
 class ChatClient:
@@ -18,20 +49,48 @@ class ChatClient:
     - Session management with unique session ID
     - Conversation history persistence in Redis
     - Message processing through Gemini AI
-    - Tool execution (check_availability, book_slot)
+    - Non-blocking tool execution (availability checks and bookings)
     - Response generation and delivery
     """
 
     # Class-level configuration
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
     CHAT_HISTORY_TTL = 3600 * 24  # 24 hours
     MAX_TOOL_ITERATIONS = 5  # Prevent infinite loops
     MODEL = "gemini-2.0-flash"
+    STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+    CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+    CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+    FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+    MAX_PARALLEL_TOOLS = int(os.getenv("MAX_PARALLEL_TOOLS", "4"))  # Per session
+    LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "20"))  # Process-wide
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+    BUSY_MESSAGE = "We're handling a lot of requests right now. Please retry in a few seconds."
+    GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "3"))
+    GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5"))
+    GEMINI_RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8"))
+    GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "false").lower() == "true"
+    GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+    GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+    GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "100"))
+    GEMINI_MAX_KEEPALIVE = int(os.getenv("GEMINI_MAX_KEEPALIVE", "20"))
+    GEMINI_KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "60"))
+    # Turns sent verbatim to the model, 0 sends the full history
+    HISTORY_WINDOW_TURNS = int(os.getenv("HISTORY_WINDOW_TURNS", "10"))
+    HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY", "true").lower() == "true"
+    # Older turns are summarized in batches to amortize the extra model call
+    HISTORY_SUMMARY_BATCH_TURNS = int(os.getenv("HISTORY_SUMMARY_BATCH_TURNS", "5"))
+    HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "300"))
+    # Keep tool calls and results with each turn and replay them while fresh
+    HISTORY_TOOL_RECORDS = os.getenv("HISTORY_TOOL_RECORDS", "true").lower() == "true"
+    HISTORY_TOOL_RECORD_MAX_AGE = int(os.getenv("HISTORY_TOOL_RECORD_MAX_AGE", "300"))
 
     # System instruction for the AI agent
     SYSTEM_INSTRUCTION = """You are a polite and efficient Booking Assistant. Your role is to help users book 1-hour time slots between 9 AM and 5 PM.
 
-Each booking is exactly 1 hour long. If a user needs multiple hours, you should book consecutive slots separately.
+Each booking is exactly 1 hour long. If a user needs multiple consecutive hours, book them together in one step with book_slots.
 
 Follow this protocol:
 1. Greet the user warmly and ask for their name if not provided.
@@ -42,6 +101,7 @@ Follow this protocol:
 6. Use book_slot to complete the booking.
 7. Provide a clear confirmation with the booking ID.
 8. If they need multiple hours, offer to book additional consecutive slots.
+9. If they ask about several days (e.g. "next week"), call check_availability_range once for the whole range instead of check_availability for each day.
 
 Important rules:
 - Always be polite and professional
@@ -50,7 +110,8 @@ Important rules:
 - If a slot is unavailable, suggest alternatives
 - Always confirm details before booking
 - Provide clear error messages if something goes wrong
-- For multiple hours, book each slot individually"""
+- For multiple consecutive hours, use book_slots instead of calling book_slot for each hour
+- Tool results from earlier turns carry a retrieved_at time. Reuse recent availability instead of checking the same date again, but always call book_slot or book_slots to book"""
 
     # Tool Declarations
     TOOLS = types.Tool(
@@ -69,6 +130,24 @@ Important rules:
                     required=["date_str"],
                 ),
             ),
+            types.FunctionDeclaration(
+                name=check_availability_range.__name__,
+                description="Summarize available 1-hour slots for every day in a date range (at most 31 days) in a single call. Use this instead of calling check_availability once per day.",
+                parameters=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "start_date": types.Schema(
+                            type=types.Type.STRING,
+                            description="First date of the range in YYYY-MM-DD format (e.g., 2026-01-19)",
+                        ),
+                        "end_date": types.Schema(
+                            type=types.Type.STRING,
+                            description="Last date of the range (inclusive) in YYYY-MM-DD format (e.g., 2026-01-25)",
+                        ),
+                    },
+                    required=["start_date", "end_date"],
+                ),
+            ),
             types.FunctionDeclaration(
                 name=book_slot.__name__,
                 description="Book a 1-hour time slot for a user. Each booking is exactly 1 hour long.",
@@ -91,31 +170,140 @@ Important rules:
                     required=["user_name", "date_str", "hour"],
                 ),
             ),
+            types.FunctionDeclaration(
+                name=book_slots.__name__,
+                description="Book several consecutive 1-hour slots for a user in one step. Either all slots are booked or none are.",
+                parameters=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "user_name": types.Schema(
+                            type=types.Type.STRING,
+                            description="Name of the user making the booking",
+                        ),
+                        "date_str": types.Schema(
+                            type=types.Type.STRING,
+                            description="The date for the booking in YYYY-MM-DD format (e.g., 2026-01-20)",
+                        ),
+                        "start_hour": types.Schema(
+                            type=types.Type.INTEGER,
+                            description="Starting hour of the first slot in 24-hour format (9-16)",
+                        ),
+                        "hours": types.Schema(
+                            type=types.Type.INTEGER,
+                            description="Number of consecutive 1-hour slots to book (the last slot must end by 17)",
+                        ),
+                    },
+                    required=["user_name", "date_str", "start_hour", "hours"],
+                ),
+            ),
         ]
     )
 
+    # Date rules for the cached prefix. The date itself is sent with each
+    # user message because the cached system instruction cannot change.
+    CACHED_SYSTEM_INSTRUCTION = f"""{SYSTEM_INSTRUCTION}
+
+CRITICAL VALIDATION RULE:
+- Each user message starts with "Current Date: YYYY-MM-DD HH:MM". Treat it as today.
+- You MUST NOT schedule any appointments for dates in the past.
+- Any date before the current date is invalid.
+- If a user asks for 'tomorrow', calculate it based on the current date."""
+
+    # Instruction for folding older turns into the rolling summary
+    SUMMARY_INSTRUCTION = """You maintain a running summary of a conversation between a user and a booking assistant.
+Merge the previous summary with the new messages into one updated summary.
+Keep the user's name, the dates and hours discussed, which slots were available or taken, confirmed bookings with their confirmation IDs, and any request still open.
+Drop greetings and small talk. Write plain text, at most 150 words."""
+
+    # Strong references to summary refreshes, which may outlive their session
+    BACKGROUND_TASKS: Set[asyncio.Task] = set()
+
+    # Shared cached content for the static system instruction and tool schema
+    CONTEXT_CACHE = GeminiContextCache(
+        MODEL, CACHED_SYSTEM_INSTRUCTION, TOOLS, CONTEXT_CACHE_TTL
+    )
+
+    # Tools that modify bookings; they never run concurrently with other tools
+    WRITE_TOOLS = frozenset({book_slot.__name__, book_slots.__name__})
+
+    # Shared pre-router answering unambiguous requests without the model
+    FAST_PATH_ROUTER = FastPathRouter() if FAST_PATH_ENABLED else None
+
+    # Admission control shared by all sessions for Gemini calls
+    LLM_LIMITER = LLMLimiter(LLM_MAX_CONCURRENT, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT)
+
+    # Retries, hedging and circuit breaking shared by all Gemini calls
+    GEMINI_CALLER = ResilientCaller(
+        GEMINI_MAX_ATTEMPTS,
+        GEMINI_RETRY_BASE_DELAY,
+        GEMINI_RETRY_MAX_DELAY,
+        CircuitBreaker(GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_RESET),
+        hedge=GEMINI_HEDGE,
+        limiter=LLM_LIMITER,
+    )
+
     # Object-level configuration
-    def __init__(self, session_id: str, db: DbSession) -> None:
+    def __init__(
+        self,
+        session_id: str,
+        redis_client: Redis,
+        client: genai.Client,
+        router: Optional[MessageRouter] = None,
+    ) -> None:
         """
         Initialize a new chat client.
 
         Args:
             session_id: Unique identifier for this client session
-            db_session: SQLAlchemy database session for tool operations
+            redis_client: Process-wide async Redis client backed by a shared pool
+            client: Process-wide Gemini client whose HTTP connections are reused
+            router: Pre-router consulted before the model (defaults to FAST_PATH_ROUTER)
         """
 
         self.session_id = session_id
-        self.db = db
-        self.redis_key = f"chat:{session_id}"
-        # Initialize redis client
-        self.redis_client = redis.from_url(self.REDIS_URL, decode_responses=True)
-        # Initialize gemini client
-        # It will automatically look for GEMINI_API_KEY environment variable
-        self.client = genai.Client()
+        self.redis_client = redis_client
+        self.router = router if router is not None else self.FAST_PATH_ROUTER
+        self.tool_semaphore = asyncio.Semaphore(self.MAX_PARALLEL_TOOLS)
+        self.history = RedisHistoryStore(
+            self.redis_client, session_id, self.CHAT_HISTORY_TTL
+        )
+        self.client = client
+        self.summary_task: Optional[asyncio.Task] = None
+        # Gemini calls made by the current turn, wasted if the turn is cancelled
+        self.turn_model_calls = 0
+        # Tool results not saved with a turn yet, reported by the next turn if
+        # the current one is cancelled or fails
+        self.unsent_tool_records: List[Dict[str, Any]] = []
+        self.unfinished_tools: Set[asyncio.Task] = set()
+
+        self.log = session_logger(logger, session_id)
+        self.log.debug("Initialized with shared google-genai client")
+
+    @classmethod
+    def create_genai_client(cls) -> genai.Client:
+        """
+        Create the Gemini client shared by all sessions.
 
-        print(f"[Client {self.session_id}] Initialized with new google-genai SDK")
+        It will automatically look for GEMINI_API_KEY environment variable.
+        The HTTP transport keeps connections alive so sessions reuse them
+        instead of paying TLS setup on every new chat.
 
-    def get_conversation_history(self) -> List[Dict[str, str]]:
+        Returns:
+            Gemini client with a bounded, keep-alive connection pool
+        """
+        limits = httpx.Limits(
+            max_connections=cls.GEMINI_MAX_CONNECTIONS,
+            max_keepalive_connections=cls.GEMINI_MAX_KEEPALIVE,
+            keepalive_expiry=cls.GEMINI_KEEPALIVE_EXPIRY,
+        )
+        return genai.Client(
+            http_options=types.HttpOptions(
+                client_args={"limits": limits},
+                async_client_args={"limits": limits},
+            )
+        )
+
+    async def get_conversation_history(self) -> List[Dict[str, str]]:
         """
         Retrieve conversation history from Redis.
 
@@ -123,19 +311,140 @@ Important rules:
             List of message dictionaries with 'role' and 'content' keys
         """
         try:
-            history_json = str(self.redis_client.get(self.redis_key))
-            if history_json:
-                history = json.loads(history_json)
-                print(
-                    f"[Client {self.session_id}] Loaded {len(history)} messages from history"
-                )
-                return history
-            return []
+            with (
+                tracer.start_as_current_span("redis.history.load") as span,
+                HISTORY_SECONDS.labels("load").time(),
+            ):
+                history = await self.history.load()
+                span.set_attribute("history.messages", len(history))
+            self.log.debug("Loaded %d messages from history", len(history))
+            return history
         except Exception as e:
-            print(f"[Client {self.session_id}] Error loading history: {e}")
+            ERRORS.labels("history").inc()
+            self.log.error("Error loading history: %s", e)
             return []
 
-    def save_conversation_history(self, history: List[Dict[str, str]]) -> None:
+    async def get_history_window(self) -> HistoryWindow:
+        """
+        Retrieve the history to send to the model.
+
+        Returns:
+            The rolling summary and the last HISTORY_WINDOW_TURNS turns, or the
+            full history if the window is disabled
+        """
+        try:
+            with (
+                tracer.start_as_current_span("redis.history.load") as span,
+                HISTORY_SECONDS.labels("load").time(),
+            ):
+                if self.HISTORY_WINDOW_TURNS > 0:
+                    window = await self.history.load_window(
+                        self.HISTORY_WINDOW_TURNS * 2
+                    )
+                else:
+                    window = HistoryWindow(None, await self.history.load(), 0)
+                span.set_attribute("history.messages", len(window.messages))
+                span.set_attribute("history.overflow", window.overflow)
+            self.log.debug(
+                "Loaded %d messages from history (%d older)",
+                len(window.messages),
+                window.overflow,
+            )
+            return window
+        except Exception as e:
+            ERRORS.labels("history").inc()
+            self.log.error("Error loading history: %s", e)
+            return HistoryWindow(None, [], 0)
+
+    def schedule_summary_refresh(self, overflow: int) -> None:
+        """
+        Fold older turns into the summary in the background once enough piled up.
+
+        Args:
+            overflow: Stored messages older than the window
+        """
+        if (
+            not self.HISTORY_SUMMARY_ENABLED
+            or self.HISTORY_WINDOW_TURNS <= 0
+            or overflow < self.HISTORY_SUMMARY_BATCH_TURNS * 2
+            or (self.summary_task and not self.summary_task.done())
+        ):
+            return
+
+        self.summary_task = asyncio.create_task(self.refresh_summary())
+        self.BACKGROUND_TASKS.add(self.summary_task)
+        self.summary_task.add_done_callback(self.BACKGROUND_TASKS.discard)
+
+    async def refresh_summary(self) -> None:
+        """Summarize the turns older than the window and trim them from Redis."""
+        try:
+            window = await self.history.load_window(self.HISTORY_WINDOW_TURNS * 2)
+            # Fold whole turns only, so the window always starts with a user message
+            count = window.overflow - window.overflow % 2
+            if count < self.HISTORY_SUMMARY_BATCH_TURNS * 2:
+                return
+
+            older = await self.history.load_oldest(count)
+            summary = await self.summarize(window.summary, older)
+            if not await self.history.fold(summary, older, window.summary):
+                HISTORY_SUMMARIES.labels("skipped").inc()
+                self.log.debug("History changed while summarizing, not folded")
+                return
+            HISTORY_SUMMARIES.labels("refreshed").inc()
+            self.log.debug("Folded %d messages into the history summary", count)
+        except LLMBusyError as e:
+            # Retried after a later turn; the window keeps the prompt bounded
+            HISTORY_SUMMARIES.labels("skipped").inc()
+            self.log.debug("Summary refresh not admitted: %s", e)
+        except Exception as e:
+            HISTORY_SUMMARIES.labels("failed").inc()
+            ERRORS.labels("summary").inc()
+            self.log.warning("Error refreshing history summary: %s", e)
+
+    async def summarize(
+        self, previous_summary: Optional[str], messages: List[Dict[str, str]]
+    ) -> str:
+        """
+        Merge a previous summary and older messages into a new summary.
+
+        Args:
+            previous_summary: Current rolling summary, if any
+            messages: Messages to fold into the summary, oldest first
+
+        Returns:
+            Updated summary text
+
+        Raises:
+            LLMBusyError: If the call is not admitted by the limiter
+            ValueError: If the model returned no text
+        """
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (
+            f"Previous summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        config = types.GenerateContentConfig(
+            system_instruction=self.SUMMARY_INSTRUCTION,
+            temperature=0.2,
+            max_output_tokens=self.HISTORY_SUMMARY_MAX_TOKENS,
+        )
+
+        async with self.LLM_LIMITER.slot(self.session_id):
+            with tracer.start_as_current_span("gemini.summarize") as span:
+                span.set_attribute("gen_ai.request.model", self.MODEL)
+                span.set_attribute("history.folded_messages", len(messages))
+                response = await self.GEMINI_CALLER.call(
+                    lambda: self.client.aio.models.generate_content(
+                        model=self.MODEL, contents=prompt, config=config
+                    )
+                )
+                record_usage(span, response)
+
+        if not response.text:
+            raise ValueError("Empty summary")
+        return response.text.strip()
+
+    async def save_conversation_history(self, history: List[Dict[str, str]]) -> None:
         """
         Save conversation history to Redis with expiration.
 
@@ -143,63 +452,181 @@ Important rules:
             history: List of message dictionaries to save
         """
         try:
-            self.redis_client.setex(
-                self.redis_key, self.CHAT_HISTORY_TTL, json.dumps(history)
-            )
-            print(
-                f"[Client {self.session_id}] Saved {len(history)} messages to history"
-            )
+            with (
+                tracer.start_as_current_span("redis.history.save"),
+                HISTORY_SECONDS.labels("save").time(),
+            ):
+                await self.history.replace(history)
+            self.log.debug("Saved %d messages to history", len(history))
         except Exception as e:
-            print(f"[Client {self.session_id}] Error saving history: {e}")
+            ERRORS.labels("history").inc()
+            self.log.error("Error saving history: %s", e)
 
-    def append_to_history(self, role: str, content: str) -> None:
+    async def append_to_history(self, *messages: Dict[str, str]) -> None:
         """
-        Append a single message to conversation history.
+        Append messages to conversation history without rewriting it.
 
         Args:
-            role: Message role ('user' or 'model')
-            content: Message content
+            messages: Message dictionaries with 'role' and 'content' keys
         """
-        history = self.get_conversation_history()
-        history.append({"role": role, "content": content})
-        self.save_conversation_history(history)
+        try:
+            with (
+                tracer.start_as_current_span("redis.history.save"),
+                HISTORY_SECONDS.labels("save").time(),
+            ):
+                await self.history.append(*messages)
+            self.log.debug("Appended %d messages to history", len(messages))
+        except Exception as e:
+            ERRORS.labels("history").inc()
+            self.log.error("Error appending to history: %s", e)
 
-    def clear_history(self) -> None:
+    async def clear_history(self) -> None:
         """Clear conversation history from Redis."""
         try:
-            self.redis_client.delete(self.redis_key)
-            print(f"[Client {self.session_id}] Cleared conversation history")
+            await self.history.clear()
+            self.log.info("Cleared conversation history")
         except Exception as e:
-            print(f"[Client {self.session_id}] Error clearing history: {e}")
+            self.log.error("Error clearing history: %s", e)
 
     def build_chat_history_for_gemini(
-        self, history: List[Dict[str, str]]
+        self, history: List[Dict[str, str]], summary: Optional[str] = None
     ) -> List[types.Content]:
         """
         Convert our history format to Gemini's expected format (new SDK).
 
         Args:
             history: Our conversation history
+            summary: Rolling summary of turns older than the history, if any
 
         Returns:
             List of Content objects formatted for Gemini chat
         """
         contents = []
+        if summary:
+            contents.append(
+                types.Content(
+                    role="user",
+                    parts=[
+                        types.Part(
+                            text=f"Summary of our earlier conversation:\n{summary}"
+                        )
+                    ],
+                )
+            )
+            contents.append(
+                types.Content(
+                    role="model",
+                    parts=[types.Part(text="Thanks, I have the earlier context.")],
+                )
+            )
+
+        now = time.time()
         for msg in history:
             if msg["role"] == "user":
                 contents.append(
                     types.Content(role="user", parts=[types.Part(text=msg["content"])])
                 )
             elif msg["role"] == "model":
+                contents.extend(self.replay_tool_records(msg.get("tools", []), now))
                 contents.append(
                     types.Content(role="model", parts=[types.Part(text=msg["content"])])
                 )
         return contents
 
-    def execute_tool(self, function_name: str, function_args: Dict) -> str:
+    def model_message(
+        self, content: str, tool_records: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Build the history entry for a model reply.
+
+        Args:
+            content: Final reply text
+            tool_records: Tools called while producing the reply
+
+        Returns:
+            Message dictionary, with compact tool records when enabled
+        """
+        message: Dict[str, Any] = {"role": "model", "content": content}
+        if self.HISTORY_TOOL_RECORDS and tool_records:
+            message["tools"] = tool_records
+        return message
+
+    @staticmethod
+    def tool_record(name: str, args: Dict, result: str) -> Dict[str, Any]:
+        """Compact, timestamped record of one tool call and its result."""
+        return {"name": name, "args": args, "result": result, "at": int(time.time())}
+
+    def replay_tool_records(
+        self, tool_records: List[Dict[str, Any]], now: float
+    ) -> List[types.Content]:
+        """
+        Turn stored tool records back into function call and response contents.
+
+        Records older than HISTORY_TOOL_RECORD_MAX_AGE are left out, so the
+        model checks again instead of trusting stale availability.
+
+        Args:
+            tool_records: Records stored with a model message
+            now: Current Unix time
+
+        Returns:
+            A model content with the calls and a user content with the results,
+            or an empty list if nothing fresh is left
+        """
+        if not self.HISTORY_TOOL_RECORDS:
+            return []
+
+        fresh = [
+            record
+            for record in tool_records
+            if now - record["at"] <= self.HISTORY_TOOL_RECORD_MAX_AGE
+        ]
+        if not fresh:
+            return []
+
+        return self.tool_record_contents(fresh)
+
+    @staticmethod
+    def tool_record_contents(tool_records: List[Dict[str, Any]]) -> List[types.Content]:
+        """Build a model content with the calls and a user content with the results."""
+        return [
+            types.Content(
+                role="model",
+                parts=[
+                    types.Part(
+                        function_call=types.FunctionCall(
+                            name=record["name"], args=record["args"]
+                        )
+                    )
+                    for record in tool_records
+                ],
+            ),
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part(
+                        function_response=types.FunctionResponse(
+                            name=record["name"],
+                            response={
+                                "result": record["result"],
+                                "retrieved_at": datetime.fromtimestamp(
+                                    record["at"]
+                                ).strftime("%Y-%m-%d %H:%M"),
+                            },
+                        )
+                    )
+                    for record in tool_records
+                ],
+            ),
+        ]
+
+    async def execute_tool(self, function_name: str, function_args: Dict) -> str:
         """
         Execute a tool function and return the result.
 
+        Each call gets its own database session, so tools never block the
+        event loop and never hold a connection between turns.
+
         Args:
             function_name: Name of the function to execute
             function_args: Dictionary of function arguments
@@ -207,164 +634,478 @@ Important rules:
         Returns:
             String result from the tool execution
         """
-        print(
-            f"[Client {self.session_id}] Executing tool: {function_name} with args: {function_args}"
+        self.log.debug("Executing tool %s", function_name)
+        log_payload(
+            self.log, "Tool arguments", tool=function_name, tool_args=function_args
+        )
+
+        with tracer.start_as_current_span("tool.execute") as span:
+            span.set_attribute("tool.name", function_name)
+            span.set_attribute("tool.args", str(function_args))
+            started = time.perf_counter()
+            try:
+                if function_name == check_availability.__name__:
+                    result = await run_tool(
+                        check_availability,
+                        check_availability_sync,
+                        function_args["date_str"],
+                    )
+
+                elif function_name == check_availability_range.__name__:
+                    result = await run_tool(
+                        check_availability_range,
+                        check_availability_range_sync,
+                        function_args["start_date"],
+                        function_args["end_date"],
+                    )
+
+                elif function_name == book_slot.__name__:
+                    result = await run_tool(
+                        book_slot,
+                        book_slot_sync,
+                        function_args["user_name"],
+                        function_args["date_str"],
+                        function_args["hour"],
+                    )
+
+                elif function_name == book_slots.__name__:
+                    result = await run_tool(
+                        book_slots,
+                        book_slots_sync,
+                        function_args["user_name"],
+                        function_args["date_str"],
+                        int(function_args["start_hour"]),
+                        int(function_args["hours"]),
+                    )
+
+                else:
+                    result = f"Error: Unknown function '{function_name}'"
+                    ERRORS.labels("tool").inc()
+                    self.log.warning(result, extra={"tool": function_name})
+                    return result
+
+                TOOL_SECONDS.labels(function_name).observe(
+                    time.perf_counter() - started
+                )
+                # Tools report database failures in their result text
+                if result.startswith("Error"):
+                    ERRORS.labels("tool").inc()
+                    self.log.warning(result, extra={"tool": function_name})
+                else:
+                    log_payload(
+                        self.log, "Tool result", tool=function_name, result=result
+                    )
+                return result
+
+            except Exception as e:
+                ERRORS.labels("tool").inc()
+                error_msg = f"Error executing {function_name}: {str(e)}"
+                self.log.error(error_msg, extra={"tool": function_name})
+                return error_msg
+
+    async def build_generate_config(
+        self, current_date: str
+    ) -> types.GenerateContentConfig:
+        """
+        Build the generation config for a turn.
+
+        With the context cache enabled, the static prefix is referenced by
+        name and the caller must send the date with the user message.
+        Otherwise the current date is injected into the system instruction.
+
+        Args:
+            current_date: Current date and time as YYYY-MM-DD HH:MM
+
+        Returns:
+            GenerateContentConfig shared by every model call in a turn
+        """
+        if self.CONTEXT_CACHE_ENABLED:
+            cache_name = await self.CONTEXT_CACHE.get_name(self.client)
+            if cache_name:
+                return types.GenerateContentConfig(
+                    cached_content=cache_name,
+                    temperature=0.7,
+                    max_output_tokens=400,
+                )
+
+        # Inject current date into system instruction
+        dynamic_system_instruction = f"""Current Date: {current_date}
+            
+            {self.SYSTEM_INSTRUCTION}
+            
+            CRITICAL VALIDATION RULE:
+            - You MUST NOT schedule any appointments for dates in the past.
+            - Today is {current_date}. Any date before this is invalid.
+            - If a user asks for 'tomorrow', calculate it based on today's date ({current_date})."""
+
+        return types.GenerateContentConfig(
+            tools=[self.TOOLS],
+            system_instruction=dynamic_system_instruction,
+            temperature=0.7,
+            max_output_tokens=400,
         )
 
+    async def generate_parts(
+        self,
+        contents: List[types.Content],
+        config: types.GenerateContentConfig,
+        stream: bool,
+        iteration: int = 0,
+    ) -> AsyncIterator[types.Part]:
+        """
+        Call Gemini and yield the parts of the first candidate.
+
+        The call holds a slot of the shared LLM_LIMITER until the response
+        has been fully consumed, and goes through GEMINI_CALLER for retries,
+        hedging and circuit breaking. For streams, opening the stream and
+        receiving the first chunk is the retried unit; once text has been
+        yielded the stream is not restarted.
+
+        Args:
+            contents: Conversation contents to send
+            config: Generation config for the call
+            stream: Yield parts as they arrive via generate_content_stream
+            iteration: Tool-loop iteration. Only the first call of a turn is
+                rejected when the queue is full.
+
+        Yields:
+            Parts (text or function calls) of the model response
+
+        Raises:
+            LLMBusyError: If the call is not admitted by the limiter or the
+                circuit breaker is open
+        """
+
+        async def open_stream():
+            response_stream = await self.client.aio.models.generate_content_stream(
+                model=self.MODEL, contents=contents, config=config
+            )
+            return await anext(response_stream, None), response_stream
+
+        async def close_stream(opened) -> None:
+            # A stream opened by a request that lost the hedge race
+            await opened[1].aclose()
+
+        async def generate():
+            return await self.client.aio.models.generate_content(
+                model=self.MODEL, contents=contents, config=config
+            )
+
+        async with self.LLM_LIMITER.slot(self.session_id, iteration == 0):
+            self.turn_model_calls += 1
+            started = time.perf_counter()
+            # Not made current: the span stays open across yields to the caller
+            span = tracer.start_span("gemini.generate_content")
+            span.set_attribute("gen_ai.request.model", self.MODEL)
+            span.set_attribute("agent.iteration", iteration)
+            span.set_attribute("agent.stream", stream)
+            try:
+                if stream:
+                    first_chunk, response_stream = await self.GEMINI_CALLER.call(
+                        open_stream, close_stream
+                    )
+                    if first_chunk is not None:
+                        record_usage(span, first_chunk)
+                        for part in self._candidate_parts(first_chunk):
+                            yield part
+                        async for chunk in response_stream:
+                            # Usage totals arrive on the last chunk
+                            record_usage(span, chunk)
+                            for part in self._candidate_parts(chunk):
+                                yield part
+                else:
+                    response = await self.GEMINI_CALLER.call(generate)
+                    record_usage(span, response)
+                    for part in self._candidate_parts(response):
+                        yield part
+            except Exception as e:
+                span.record_exception(e)
+                raise
+            finally:
+                span.end()
+
+            GEMINI_CALL_SECONDS.labels(str(iteration)).observe(
+                time.perf_counter() - started
+            )
+
+    @staticmethod
+    def _candidate_parts(response: types.GenerateContentResponse) -> List[types.Part]:
+        """Return the parts of the first candidate, or an empty list."""
+        if (
+            response.candidates
+            and response.candidates[0].content
+            and response.candidates[0].content.parts
+        ):
+            return response.candidates[0].content.parts
+        return []
+
+    async def execute_tool_shielded(
+        self, function_name: str, function_args: Dict
+    ) -> str:
+        """
+        Execute a tool so that cancelling the turn does not abort it.
+
+        A booking that has started runs to completion even if the user sends
+        another message meanwhile. Every result is added to
+        unsent_tool_records as soon as its tool finishes, so it survives the
+        turn being cancelled while other calls are still running; the turn
+        that saves it to history takes it out again. Otherwise the next turn
+        reports it instead of repeating the work.
+
+        Args:
+            function_name: Name of the function to execute
+            function_args: Arguments for the function
+
+        Returns:
+            String result from the tool execution
+        """
+        task = asyncio.ensure_future(self.execute_tool(function_name, function_args))
+        # Added before shield() adds its own callback, so the record exists by
+        # the time the awaiting turn resumes
+        task.add_done_callback(
+            lambda done: self.keep_tool_result(function_name, function_args, done)
+        )
+        self.unfinished_tools.add(task)
+        task.add_done_callback(self.unfinished_tools.discard)
         try:
-            if function_name == check_availability.__name__:
-                result = check_availability(self.db, function_args["date_str"])
-
-            elif function_name == book_slot.__name__:
-                result = book_slot(
-                    self.db,
-                    function_args["user_name"],
-                    function_args["date_str"],
-                    function_args["hour"],
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Keep a reference until the tool finishes on its own
+            self.BACKGROUND_TASKS.add(task)
+            task.add_done_callback(self.BACKGROUND_TASKS.discard)
+            raise
+
+    def keep_tool_result(
+        self, function_name: str, function_args: Dict, task: asyncio.Task
+    ) -> None:
+        """Record the result of a finished tool until a turn saves it."""
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.unsent_tool_records.append(
+            self.tool_record(function_name, dict(function_args or {}), task.result())
+        )
+
+    async def execute_tool_calls(
+        self, function_calls: List[types.FunctionCall]
+    ) -> List[types.Part]:
+        """
+        Execute the function calls of one model turn.
+
+        Consecutive reads run concurrently (at most MAX_PARALLEL_TOOLS at a
+        time per session). Writes act as barriers and run one at a time in
+        the order the model requested them, so a read issued after a booking
+        sees its result.
+
+        Args:
+            function_calls: Function calls in the order the model returned them
+
+        Returns:
+            Function response parts in the same order
+        """
+
+        async def run(function_call: types.FunctionCall) -> str:
+            async with self.tool_semaphore:
+                return await self.execute_tool_shielded(
+                    function_call.name, function_call.args
                 )
 
+        results: List[str] = []
+        pending_reads = []
+        for function_call in function_calls:
+            if function_call.name in self.WRITE_TOOLS:
+                results.extend(await asyncio.gather(*pending_reads))
+                pending_reads = []
+                results.append(await run(function_call))
             else:
-                result = f"Error: Unknown function '{function_name}'"
+                pending_reads.append(run(function_call))
+        results.extend(await asyncio.gather(*pending_reads))
+
+        return [
+            types.Part(
+                function_response=types.FunctionResponse(
+                    name=function_call.name,
+                    response={"result": tool_result},
+                )
+            )
+            for function_call, tool_result in zip(function_calls, results)
+        ]
 
-            print(f"[Client {self.session_id}] Tool result: {result}")
-            return result
+    async def try_fast_path(self, user_message: str) -> Optional[str]:
+        """
+        Answer the message directly if the pre-router recognises it.
 
-        except Exception as e:
-            error_msg = f"Error executing {function_name}: {str(e)}"
-            print(f"[Client {self.session_id}] {error_msg}")
-            return error_msg
+        Args:
+            user_message: The message from the user
 
-    async def process_message(self, user_message: str) -> str:
+        Returns:
+            Templated reply, or None if the model should handle the message
         """
-        Process a user message through the AI agent with tool calling.
+        if not self.router:
+            return None
+
+        match = self.router.match(user_message)
+        FAST_PATH_ROUTES.labels(match.intent if match else "fallback").inc()
+        if not match:
+            return None
+
+        self.log.debug("Fast path hit: %s", match.intent)
+        tool_result = await self.execute_tool_shielded(
+            match.tool_name, match.tool_args
+        )
+        reply = match.render(tool_result)
+
+        await self.append_to_history(
+            {"role": "user", "content": user_message},
+            self.model_message(reply, list(self.unsent_tool_records)),
+        )
+        self.unsent_tool_records.clear()
+        return reply
+
+    async def respond(self, user_message: str, stream: bool) -> AsyncIterator[str]:
+        """
+        Run one agent turn and yield the response text as it is produced.
 
         This is the main method that:
         1. Loads conversation history
         2. Sends message to Gemini
         3. Handles tool calls (function calling)
-        4. Returns final response
+        4. Yields the response text
         5. Saves updated history
 
         Args:
             user_message: The message from the user
+            stream: Forward partial text chunks as the model produces them
 
-        Returns:
-            Agent's response string
+        Yields:
+            Chunks of the agent's response
         """
+        self.turn_model_calls = 0
+        if self.unfinished_tools:
+            # Let tools of a cancelled turn finish so they are not repeated
+            await asyncio.wait(set(self.unfinished_tools))
+        # Tools that completed for cancelled or failed turns are reported by
+        # this one; tools run from here on are recorded in unsent_tool_records
+        unsent_records, self.unsent_tool_records = self.unsent_tool_records, []
+        saved = False
         try:
-            print(f"[Client {self.session_id}] Processing message: '{user_message}'")
+            log_payload(self.log, "Processing message", user_message=user_message)
 
-            # Get conversation history
-            history = self.get_conversation_history()
+            # Answer unambiguous requests without calling the model, unless
+            # the model has to explain what a cancelled turn already did
+            fast_reply = None
+            if not unsent_records:
+                fast_reply = await self.try_fast_path(user_message)
+            if fast_reply is not None:
+                yield fast_reply
+                return
 
-            # Build Gemini-format history
-            contents = self.build_chat_history_for_gemini(history)
+            # Get the recent turns and the summary of everything before them
+            window = await self.get_history_window()
 
-            # Add user message to contents
-            contents.append(
-                types.Content(role="user", parts=[types.Part(text=user_message)])
+            # Build Gemini-format history
+            contents = self.build_chat_history_for_gemini(
+                window.messages, window.summary
             )
 
-            # Generate response with the new SDK
-            # Inject current date into system instruction
             current_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-            
-            dynamic_system_instruction = f"""Current Date: {current_date}
-            
-            {self.SYSTEM_INSTRUCTION}
-            
-            CRITICAL VALIDATION RULE:
-            - You MUST NOT schedule any appointments for dates in the past.
-            - Today is {current_date}. Any date before this is invalid.
-            - If a user asks for 'tomorrow', calculate it based on today's date ({current_date})."""
+            config = await self.build_generate_config(current_date)
 
-            # Use Async Client
-            response = await self.client.aio.models.generate_content(
-                model=self.MODEL,
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    tools=[self.TOOLS],
-                    system_instruction=dynamic_system_instruction,
-                    temperature=0.7,
-                    max_output_tokens=400,
-                ),
-            )
+            # Add user message to contents
+            user_parts = [types.Part(text=user_message)]
+            if config.cached_content:
+                user_parts.insert(0, types.Part(text=f"Current Date: {current_date}"))
+            if unsent_records:
+                CARRIED_TOOL_RESULTS.inc(len(unsent_records))
+                calls, responses = self.tool_record_contents(unsent_records)
+                contents.append(calls)
+                user_parts = responses.parts + user_parts
+            contents.append(types.Content(role="user", parts=user_parts))
 
-            # Handle tool calling loop
-            iteration = 0
-            current_contents = contents.copy()
-
-            while iteration < self.MAX_TOOL_ITERATIONS:
-                # Check if there are function calls in the response
-                if (
-                    response.candidates
-                    and response.candidates[0].content
-                    and response.candidates[0].content.parts
-                ):
-                    has_function_call = False
-                    function_responses = []
-
-                    for part in response.candidates[0].content.parts:
-                        if part.function_call:
-                            has_function_call = True
-                            function_name = part.function_call.name
-                            function_args = part.function_call.args
-
-                            # execute the tool
-                            # Note: Tools are currently synchronous (DB operations).
-                            # If they become slow, they should be wrapped in asyncio.to_thread
-                            tool_result = self.execute_tool(
-                                function_name, function_args
-                            )
-
-                            # Create function response
-                            function_responses.append(
-                                types.Part(
-                                    function_response=types.FunctionResponse(
-                                        name=function_name,
-                                        response={"result": tool_result},
-                                    )
-                                )
-                            )
-                    if has_function_call:
-                        # Add model's response to history
-                        current_contents.append(response.candidates[0].content)
-
-                        # Add function responses
-                        current_contents.append(
-                            types.Content(role="user", parts=function_responses)
-                        )
+            response_chunks = []
 
-                        # Send function results back to model (Async)
-                        response = await self.client.aio.models.generate_content(
-                            model=self.MODEL,
-                            contents=current_contents,
-                            config=types.GenerateContentConfig(
-                                tools=[self.TOOLS],
-                                system_instruction=dynamic_system_instruction,
-                                temperature=0.7,
-                                max_output_tokens=400,
-                            ),
-                        )
+            # Handle tool calling loop: one initial call plus up to
+            # MAX_TOOL_ITERATIONS follow-ups carrying tool results
+            for iteration in range(self.MAX_TOOL_ITERATIONS + 1):
+                model_parts = []
+                function_calls = []
 
-                        iteration += 1
-                    else:
-                        # No function calls, we have the final response
-                        break
-                else:
+                async with aclosing(
+                    self.generate_parts(contents, config, stream, iteration)
+                ) as parts:
+                    async for part in parts:
+                        model_parts.append(part)
+                        if part.function_call:
+                            function_calls.append(part.function_call)
+                        elif part.text:
+                            response_chunks.append(part.text)
+                            yield part.text
+
+                if not function_calls or iteration == self.MAX_TOOL_ITERATIONS:
+                    # No function calls, we have the final response
                     break
-            # Extract final text response
-            final_response = response.text if response.text else "No Response"
-            print(f"[Client {self.session_id}] Generated response: '{final_response}'")
 
-            # Update conversation history
-            self.append_to_history("user", user_message)
-            self.append_to_history("model", final_response)
+                # execute the tools requested in this turn
+                TOOL_ITERATIONS.inc()
+                function_responses = await self.execute_tool_calls(function_calls)
+
+                # Add model's response and the function results, then send
+                # them back to the model on the next iteration
+                contents.append(types.Content(role="model", parts=model_parts))
+                contents.append(types.Content(role="user", parts=function_responses))
 
-            return final_response
+            final_response = "".join(response_chunks)
+            if not final_response:
+                final_response = "No Response"
+                yield final_response
+            log_payload(self.log, "Generated response", response=final_response)
+
+            # Update conversation history
+            tool_records = unsent_records + self.unsent_tool_records
+            await self.append_to_history(
+                {"role": "user", "content": user_message},
+                self.model_message(final_response, tool_records),
+            )
+            saved = True
+            self.unsent_tool_records.clear()
+            stored = window.overflow + len(window.messages) + 2
+            self.schedule_summary_refresh(stored - self.HISTORY_WINDOW_TURNS * 2)
+        except LLMBusyError as e:
+            ERRORS.labels("llm_busy").inc()
+            self.log.warning("Model call not admitted: %s", e)
+            yield self.BUSY_MESSAGE
         except Exception as e:
+            ERRORS.labels("agent").inc()
             error_msg = (
                 f"I apologize, but I encountered an error: {str(e)}. Please try again."
             )
-            print(f"[Client {self.session_id}] Error processing message: {e}")
-            return error_msg
+            self.log.exception("Error processing message: %s", e)
+            yield error_msg
+        finally:
+            if not saved:
+                # Cancelled or failed: the next turn reports the carried tools
+                # along with any this turn completed
+                self.unsent_tool_records[:0] = unsent_records
+
+    async def process_message(self, user_message: str) -> str:
+        """
+        Process a user message through the AI agent with tool calling.
+
+        Args:
+            user_message: The message from the user
+
+        Returns:
+            Agent's response string
+        """
+        return "".join([chunk async for chunk in self.respond(user_message, False)])
+
+    def process_message_stream(self, user_message: str) -> AsyncIterator[str]:
+        """
+        Process a user message, streaming partial response text.
+
+        Args:
+            user_message: The message from the user
+
+        Returns:
+            Async iterator over chunks of the agent's response
+        """
+        return self.respond(user_message, True)
@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Iterable, List, Optional
+
+from logs import get_logger
+from redis.asyncio import Redis
+
+logger = get_logger("availability_cache")
+
+AVAILABILITY_CACHE_ENABLED = (
+    os.getenv("AVAILABILITY_CACHE_ENABLED", "true").lower() == "true"
+)
+AVAILABILITY_CACHE_TTL = int(os.getenv("AVAILABILITY_CACHE_TTL", "30"))
+AVAILABILITY_CACHE_SIZE = int(os.getenv("AVAILABILITY_CACHE_SIZE", "1024"))
+# Only takes effect with DB_ASYNC; the sync tools update the local cache only
+AVAILABILITY_CACHE_SHARED = (
+    os.getenv("AVAILABILITY_CACHE_SHARED", "false").lower() == "true"
+)
+AVAILABILITY_CACHE_SHARED_TTL = int(os.getenv("AVAILABILITY_CACHE_SHARED_TTL", "3600"))
+
+# Bookable 1-hour slots start at 9..16, bit i of the mask is hour FIRST_HOUR + i
+FIRST_HOUR = 9
+SLOT_COUNT = 8
+
+# How long a booking is merged into fills that may have read the database
+# before it committed
+PENDING_BOOKING_TTL = 60
+
+# OR the bit in only if the date is already cached; a partial mask would
+# otherwise claim the remaining slots are free. The bit is also kept under
+# the pending key, so a fill computed before the booking committed still
+# includes it.
+_MARK_BOOKED_SCRIPT = """
+local bits = tonumber(ARGV[1])
+local pending = tonumber(redis.call('GET', KEYS[2]) or '0')
+redis.call('SET', KEYS[2], bit.bor(pending, bits), 'EX', ARGV[2])
+local mask = redis.call('GET', KEYS[1])
+if mask then
+    redis.call('SET', KEYS[1], bit.bor(tonumber(mask), bits), 'KEEPTTL')
+    return 1
+end
+return 0
+"""
+
+# Store a mask read from the database unless a newer one is cached, merging in
+# bookings that committed while it was being read
+_FILL_SCRIPT = """
+local pending = tonumber(redis.call('GET', KEYS[2]) or '0')
+local mask = bit.bor(tonumber(ARGV[1]), pending)
+return redis.call('SET', KEYS[1], mask, 'EX', ARGV[2], 'NX')
+"""
+
+
+def hours_to_mask(hours: Iterable[int]) -> int:
+    """Encode booked start hours as an 8-bit mask."""
+    mask = 0
+    for hour in hours:
+        if FIRST_HOUR <= hour < FIRST_HOUR + SLOT_COUNT:
+            mask |= 1 << (hour - FIRST_HOUR)
+    return mask
+
+
+def mask_to_hours(mask: int) -> List[int]:
+    """Decode an 8-bit mask into booked start hours."""
+    return [FIRST_HOUR + i for i in range(SLOT_COUNT) if mask & (1 << i)]
+
+
+class AvailabilityCache:
+    """
+    Per-date booked-slot bitmaps with an optional Redis-backed shared tier.
+
+    The local tier is an LRU bounded by max_entries whose entries expire after
+    ttl seconds; the TTL also bounds how long a worker can miss bookings made
+    by other workers. The shared tier stores each mask as an integer under
+    ``availability:{date}`` so all workers see write-through updates from
+    book_slot.
+
+    A mask read from the database can be stale by the time it is stored if
+    a booking committed in between. Both tiers therefore remember bookings
+    for PENDING_BOOKING_TTL seconds, under ``availability:{date}:pending``
+    in Redis, and merge them into every fill.
+
+    The local tier has synchronous ``*_local`` methods so the thread-pool
+    fallback tools can use it; the coroutine methods also consult the shared
+    tier once one is attached.
+    """
+
+    def __init__(self, ttl: int, max_entries: int, shared_ttl: int = 3600) -> None:
+        """
+        Initialize the cache with only the local tier.
+
+        Args:
+            ttl: Lifetime of local entries in seconds
+            max_entries: Maximum number of dates kept in the local tier
+            shared_ttl: Lifetime of shared-tier entries in seconds
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared_ttl = shared_ttl
+        self.redis_client: Optional[Redis] = None
+        self._entries: "OrderedDict[date, tuple[int, float]]" = OrderedDict()
+        self._pending: "OrderedDict[date, tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._mark_booked = None
+        self._fill = None
+
+    def attach_redis(self, redis_client: Redis) -> None:
+        """
+        Enable the shared tier.
+
+        Args:
+            redis_client: Process-wide async Redis client
+        """
+        self.redis_client = redis_client
+        self._mark_booked = redis_client.register_script(_MARK_BOOKED_SCRIPT)
+        self._fill = redis_client.register_script(_FILL_SCRIPT)
+
+    @staticmethod
+    def _shared_key(target_date: date) -> str:
+        return f"availability:{target_date.isoformat()}"
+
+    @staticmethod
+    def _pending_key(target_date: date) -> str:
+        return f"availability:{target_date.isoformat()}:pending"
+
+    def _pending_mask(self, target_date: date, now: float) -> int:
+        """Bits of recent bookings on a date; call with the lock held."""
+        entry = self._pending.get(target_date)
+        if entry and entry[1] > now:
+            return entry[0]
+        if entry:
+            del self._pending[target_date]
+        return 0
+
+    def get_local(self, target_date: date) -> Optional[int]:
+        """
+        Return the locally cached mask for a date, or None on a miss.
+
+        Args:
+            target_date: Date to look up
+
+        Returns:
+            8-bit mask of booked hours, or None if not cached
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(target_date)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(target_date)
+                return entry[0]
+            if entry:
+                del self._entries[target_date]
+        return None
+
+    def set_local(self, target_date: date, mask: int) -> None:
+        """
+        Store a mask in the local tier, evicting the least recently used date.
+
+        Recent bookings on the date are merged in, in case the mask was read
+        from the database before they committed.
+
+        Args:
+            target_date: Date the mask belongs to
+            mask: 8-bit mask of booked hours
+        """
+        now = time.monotonic()
+        with self._lock:
+            mask |= self._pending_mask(target_date, now)
+            self._entries[target_date] = (mask, now + self.ttl)
+            self._entries.move_to_end(target_date)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def mark_booked_local(self, target_date: date, hour: int) -> None:
+        """
+        Set the bit for a booked slot if the date is cached locally, and keep
+        it for fills that are reading the database meanwhile.
+
+        Args:
+            target_date: Date of the booking
+            hour: Starting hour of the booked slot
+        """
+        bits = hours_to_mask([hour])
+        now = time.monotonic()
+        with self._lock:
+            self._pending[target_date] = (
+                self._pending_mask(target_date, now) | bits,
+                now + PENDING_BOOKING_TTL,
+            )
+            self._pending.move_to_end(target_date)
+            while len(self._pending) > self.max_entries:
+                self._pending.popitem(last=False)
+
+            entry = self._entries.get(target_date)
+            if entry:
+                self._entries[target_date] = (entry[0] | bits, entry[1])
+
+    async def get(self, target_date: date) -> Optional[int]:
+        """
+        Return the booked-slot mask from the local or shared tier.
+
+        Args:
+            target_date: Date to look up
+
+        Returns:
+            8-bit mask of booked hours, or None if not cached
+        """
+        mask = self.get_local(target_date)
+        if mask is not None or not self.redis_client:
+            return mask
+
+        try:
+            raw = await self.redis_client.get(self._shared_key(target_date))
+        except Exception as e:
+            logger.warning("Error reading shared tier: %s", e)
+            return None
+        if raw is None:
+            return None
+
+        mask = int(raw)
+        self.set_local(target_date, mask)
+        return mask
+
+    async def set(self, target_date: date, mask: int) -> None:
+        """
+        Cache the mask computed from the database for a date.
+
+        Args:
+            target_date: Date the mask belongs to
+            mask: 8-bit mask of booked hours
+        """
+        self.set_local(target_date, mask)
+        if not self._fill:
+            return
+
+        try:
+            # NX keeps a newer write-through update from being overwritten
+            await self._fill(
+                keys=[self._shared_key(target_date), self._pending_key(target_date)],
+                args=[mask, self.shared_ttl],
+            )
+        except Exception as e:
+            logger.warning("Error writing shared tier: %s", e)
+
+    async def mark_booked(self, target_date: date, hour: int) -> None:
+        """
+        Write-through update after a booking commits.
+
+        Args:
+            target_date: Date of the booking
+            hour: Starting hour of the booked slot
+        """
+        self.mark_booked_local(target_date, hour)
+        if not self._mark_booked:
+            return
+
+        try:
+            await self._mark_booked(
+                keys=[self._shared_key(target_date), self._pending_key(target_date)],
+                args=[hours_to_mask([hour]), PENDING_BOOKING_TTL],
+            )
+        except Exception as e:
+            logger.warning("Error updating shared tier: %s", e)
+
+
+def create_availability_cache() -> Optional[AvailabilityCache]:
+    """Build the process-wide availability cache from the environment."""
+    if not AVAILABILITY_CACHE_ENABLED:
+        return None
+    return AvailabilityCache(
+        AVAILABILITY_CACHE_TTL, AVAILABILITY_CACHE_SIZE, AVAILABILITY_CACHE_SHARED_TTL
+    )
@@ -0,0 +1,287 @@
+"""
+Microbenchmarks for the check_availability and book_slot tools.
+
+For every requested table size the booking table is recreated and seeded
+with a reproducible pattern of bookings spread over consecutive days, then
+the tools are timed exactly as the agent calls them (through run_tool):
+
+- check_availability on random seeded dates, sequentially and concurrently
+- book_slot on distinct free slots (uncontended)
+- book_slot with many workers racing for the same slot (contended)
+
+Run from the backend directory. Without --database-url a temporary SQLite
+file is used; point it at a scratch Postgres database to compare, because
+the booking table there is dropped and recreated:
+
+    python -m benchmarks.db_bench --rows 10000 100000 1000000 --output db.json
+    python -m benchmarks.db_bench --database-url postgresql://u:p@localhost/bench
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+from benchmarks.report import percentiles
+
+SEED_START = date(2000, 1, 1)
+SEED_BATCH_SIZE = 50_000
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000],
+        help="Table sizes to benchmark, e.g. 10000 100000 10000000",
+    )
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    parser.add_argument(
+        "--density",
+        type=float,
+        default=0.6,
+        help="Fraction of slots booked within the seeded date range",
+    )
+    parser.add_argument("--checks", type=int, default=500)
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--contenders", type=int, default=50, help="Workers racing for one slot"
+    )
+    parser.add_argument("--contended-rounds", type=int, default=10)
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Keep the availability cache on (off by default to time the queries)",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args()
+
+
+def seed_bookings(engine, booking_table, rows: int, density: float, seed: int) -> int:
+    """
+    Recreate the booking table and fill it with `rows` bookings.
+
+    Slots are walked day by day from SEED_START and each one is booked with
+    probability `density`, so availability queries see realistic gaps.
+
+    Returns:
+        Number of seeded days
+    """
+    from availability_cache import FIRST_HOUR, SLOT_COUNT
+
+    booking_table.drop(engine, checkfirst=True)
+    booking_table.create(engine)
+
+    rng = random.Random(seed)
+    created_at = datetime.now()
+    batch: List[Dict] = []
+    inserted = 0
+    day = SEED_START
+    with engine.begin() as conn:
+        while inserted < rows:
+            for hour in range(FIRST_HOUR, FIRST_HOUR + SLOT_COUNT):
+                if inserted + len(batch) >= rows or rng.random() >= density:
+                    continue
+                batch.append(
+                    {
+                        "user_name": f"seed-{inserted + len(batch)}",
+                        "start_time": datetime.combine(day, datetime.min.time())
+                        + timedelta(hours=hour),
+                        "created_at": created_at,
+                    }
+                )
+            if len(batch) >= SEED_BATCH_SIZE or inserted + len(batch) >= rows:
+                conn.execute(booking_table.insert(), batch)
+                inserted += len(batch)
+                batch = []
+            day += timedelta(days=1)
+
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"ANALYZE {booking_table.name}")
+
+    return (day - SEED_START).days
+
+
+async def measure(
+    calls: List[Callable[[], Awaitable[str]]], concurrency: int
+) -> Dict:
+    """Run the calls with bounded concurrency and time each one."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def timed(make_call: Callable[[], Awaitable[str]]) -> str:
+        async with semaphore:
+            started = time.perf_counter()
+            result = await make_call()
+            latencies.append(time.perf_counter() - started)
+            return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(timed(make_call) for make_call in calls))
+    duration = time.perf_counter() - started
+
+    return {
+        "calls": len(calls),
+        "concurrency": concurrency,
+        "ops_per_second": len(calls) / duration if duration else 0,
+        "latency_seconds": percentiles(latencies),
+        "results": results,
+    }
+
+
+def summarize(measurement: Dict) -> Dict:
+    """Drop raw results, keeping success and error counts."""
+    results = measurement.pop("results")
+    measurement["succeeded"] = sum(result.startswith("✓") for result in results)
+    measurement["errors"] = sum(result.startswith("Error") for result in results)
+    return measurement
+
+
+async def run_size(args: argparse.Namespace, rows: int) -> Dict:
+    import tools
+    from availability_cache import create_availability_cache
+    from database import Booking, engine
+    from tools import (
+        book_slot,
+        book_slot_sync,
+        check_availability,
+        check_availability_sync,
+        run_tool,
+    )
+
+    # Start every size with an empty cache, the table is rebuilt below
+    tools.availability_cache = create_availability_cache()
+
+    started = time.perf_counter()
+    days = seed_bookings(engine, Booking.__table__, rows, args.density, args.seed)
+    seed_seconds = time.perf_counter() - started
+
+    rng = random.Random(args.seed)
+    # Fresh dates after the seeded range are guaranteed to be free
+    free_from = SEED_START + timedelta(days=days + 1)
+
+    def check(day: date):
+        return lambda: run_tool(
+            check_availability, check_availability_sync, day.isoformat()
+        )
+
+    def book(day: date, hour: int, user_name: str):
+        return lambda: run_tool(
+            book_slot, book_slot_sync, user_name, day.isoformat(), hour
+        )
+
+    check_days = [
+        SEED_START + timedelta(days=rng.randrange(days)) for _ in range(args.checks)
+    ]
+    results = {
+        "rows": rows,
+        "seeded_days": days,
+        "seed_seconds": seed_seconds,
+        "check_availability": summarize(
+            await measure([check(day) for day in check_days], 1)
+        ),
+        "check_availability_concurrent": summarize(
+            await measure([check(day) for day in check_days], args.concurrency)
+        ),
+    }
+
+    slots = [
+        (free_from + timedelta(days=index // 8), 9 + index % 8)
+        for index in range(args.bookings)
+    ]
+    results["book_slot"] = summarize(
+        await measure(
+            [book(day, hour, f"bench-{i}") for i, (day, hour) in enumerate(slots)],
+            args.concurrency,
+        )
+    )
+
+    contended_from = free_from + timedelta(days=args.bookings // 8 + 1)
+    rounds = []
+    for round_index in range(args.contended_rounds):
+        day = contended_from + timedelta(days=round_index)
+        rounds.append(
+            summarize(
+                await measure(
+                    [book(day, 10, f"racer-{i}") for i in range(args.contenders)],
+                    args.contenders,
+                )
+            )
+        )
+    results["book_slot_contended"] = {
+        "rounds": len(rounds),
+        "contenders": args.contenders,
+        "ops_per_second": percentiles([r["ops_per_second"] for r in rounds]),
+        "latency_p99_seconds": percentiles(
+            [r["latency_seconds"]["p99"] for r in rounds]
+        ),
+        # Exactly one racer per round must win, anything else is a correctness bug
+        "double_bookings": sum(r["succeeded"] > 1 for r in rounds),
+        "rounds_without_winner": sum(r["succeeded"] == 0 for r in rounds),
+        "errors": sum(r["errors"] for r in rounds),
+    }
+
+    return results
+
+
+async def run(args: argparse.Namespace) -> List[Dict]:
+    from database import async_engine
+
+    try:
+        return [await run_size(args, rows) for rows in args.rows]
+    finally:
+        if async_engine is not None:
+            await async_engine.dispose()
+
+
+def main() -> None:
+    args = parse_args()
+    if not 0 < args.density <= 1:
+        raise SystemExit("--density must be in (0, 1]")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configuration is read at import time, so set it before importing tools
+        os.environ["DATABASE_URL"] = args.database_url or (
+            f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        )
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        os.environ["AVAILABILITY_CACHE_ENABLED"] = "true" if args.cache else "false"
+
+        from database import DB_ASYNC_ENABLED, engine
+
+        sizes = asyncio.run(run(args))
+        dialect = engine.dialect.name
+        engine.dispose()
+
+    report = {
+        "database": dialect,
+        "async_driver": DB_ASYNC_ENABLED,
+        "availability_cache": args.cache,
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "database_url")
+        },
+        "sizes": sizes,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+In-process stand-ins for Gemini and Redis used by the offline benchmarks.
+
+They implement only the calls the service makes, with enough fidelity that
+the agent loop, streaming, tool execution and history code run unchanged.
+"""
+
+import asyncio
+import random
+import re
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from google.genai import types
+
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+HOUR_PATTERN = re.compile(r"\b(\d{1,2})(?::00|\s*(?:am|pm))", re.IGNORECASE)
+
+
+class FakeGenaiClient:
+    """
+    Scripted replacement for google.genai.Client.
+
+    A user message with a date and "book" yields a book_slot call, one with
+    only a date yields check_availability, and anything else a short text
+    reply. Tool results are answered with text. Latencies are drawn from the
+    configured means with +/- jitter, so the service sees realistic overlap.
+    """
+
+    def __init__(
+        self,
+        first_token_latency: float = 0.3,
+        chunk_latency: float = 0.05,
+        jitter: float = 0.2,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        Initialize the fake client.
+
+        Args:
+            first_token_latency: Mean seconds until the first chunk or response
+            chunk_latency: Mean seconds between streamed chunks
+            jitter: Relative latency spread, 0.2 means +/- 20%
+            seed: Seed for reproducible latencies
+        """
+        self.first_token_latency = first_token_latency
+        self.chunk_latency = chunk_latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.aio = _FakeAsyncClient(self)
+
+    def close(self) -> None:
+        pass
+
+    def delay(self, mean: float) -> float:
+        return max(0.0, mean * self.random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def script(self, contents: List[types.Content]) -> List[types.Part]:
+        """Decide the model parts for the next response."""
+        last = contents[-1]
+        tool_results = [
+            part.function_response.response.get("result")
+            for part in last.parts or []
+            if part.function_response
+        ]
+        if tool_results:
+            summary = " ".join(str(result) for result in tool_results)
+            return [types.Part(text=f"Here is what I found. {summary} Anything else?")]
+
+        text = " ".join(part.text for part in last.parts or [] if part.text)
+        if text.startswith("Previous summary:"):
+            return [types.Part(text="The user checked availability and booked slots.")]
+
+        date_match = DATE_PATTERN.search(text)
+        if date_match and "book" in text.lower():
+            hour_match = HOUR_PATTERN.search(text)
+            hour = int(hour_match.group(1)) if hour_match else 10
+            return [
+                types.Part(
+                    function_call=types.FunctionCall(
+                        name="book_slot",
+                        args={
+                            "user_name": "Load Test",
+                            "date_str": date_match.group(0),
+                            "hour": hour,
+                        },
+                    )
+                )
+            ]
+        if date_match:
+            return [
+                types.Part(
+                    function_call=types.FunctionCall(
+                        name="check_availability",
+                        args={"date_str": date_match.group(0)},
+                    )
+                )
+            ]
+        return [
+            types.Part(
+                text="Hello! I can check availability and book one-hour slots "
+                "between 9:00 and 17:00. Which date works for you?"
+            )
+        ]
+
+
+class _FakeAsyncClient:
+    def __init__(self, client: FakeGenaiClient) -> None:
+        self.models = _FakeModels(client)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class _FakeModels:
+    def __init__(self, client: FakeGenaiClient) -> None:
+        self.client = client
+
+    async def generate_content(
+        self, model: str, contents: Any, config: Any
+    ) -> types.GenerateContentResponse:
+        self.client.calls += 1
+        contents = _as_contents(contents)
+        parts = self.client.script(contents)
+        await asyncio.sleep(self.client.delay(self.client.first_token_latency))
+        return _response(parts, contents)
+
+    async def generate_content_stream(
+        self, model: str, contents: Any, config: Any
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        self.client.calls += 1
+        contents = _as_contents(contents)
+        parts = self.client.script(contents)
+        await asyncio.sleep(self.client.delay(self.client.first_token_latency))
+        return self._stream(parts, contents)
+
+    async def _stream(
+        self, parts: List[types.Part], contents: List[types.Content]
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        if parts[0].function_call:
+            yield _response(parts, contents)
+            return
+
+        words = parts[0].text.split(" ")
+        chunks = [" ".join(words[i : i + 4]) + " " for i in range(0, len(words), 4)]
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(self.client.delay(self.client.chunk_latency))
+            # Like the real API, usage totals arrive on the last chunk
+            last = index == len(chunks) - 1
+            yield _response([types.Part(text=chunk)], contents if last else None)
+
+
+def _as_contents(contents: Any) -> List[types.Content]:
+    if isinstance(contents, str):
+        return [types.Content(role="user", parts=[types.Part(text=contents)])]
+    return contents
+
+
+def _response(
+    parts: List[types.Part], contents: Optional[List[types.Content]]
+) -> types.GenerateContentResponse:
+    usage = None
+    if contents is not None:
+        prompt_chars = sum(
+            len(part.text or "") for content in contents for part in content.parts or []
+        )
+        output_chars = sum(len(part.text or "") for part in parts)
+        usage = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_chars // 4,
+            candidates_token_count=output_chars // 4,
+        )
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(content=types.Content(role="model", parts=parts))
+        ],
+        usage_metadata=usage,
+    )
+
+
+class FakeRedis:
+    """
+    Single-process Redis stand-in for the commands the service uses.
+
+    Values live in plain dicts. TTLs are recorded but never expire, which is
+    fine for runs far shorter than the configured history TTL.
+    """
+
+    def __init__(self, connection_pool: Any = None) -> None:
+        self.strings: Dict[str, str] = {}
+        self.lists: Dict[str, List[str]] = defaultdict(list)
+        self.ttls: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.strings.get(key)
+
+    async def set(
+        self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False
+    ) -> Optional[bool]:
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = str(value)
+        if ex is not None:
+            self.ttls[key] = ex
+        return True
+
+    async def getdel(self, key: str) -> Optional[str]:
+        self.ttls.pop(key, None)
+        return self.strings.pop(key, None)
+
+    async def lindex(self, key: str, index: int) -> Optional[str]:
+        values = self.lists.get(key, [])
+        return values[index] if -len(values) <= index < len(values) else None
+
+    async def lrange(self, key: str, start: int, end: int) -> List[str]:
+        values = self.lists.get(key, [])
+        return values[start : None if end == -1 else end + 1]
+
+    async def llen(self, key: str) -> int:
+        return len(self.lists.get(key, []))
+
+    async def ltrim(self, key: str, start: int, end: int) -> bool:
+        if key in self.lists:
+            self.lists[key] = self.lists[key][start : None if end == -1 else end + 1]
+        return True
+
+    async def lpush(self, key: str, *values: Any) -> int:
+        self.lists[key][:0] = reversed([str(value) for value in values])
+        return len(self.lists[key])
+
+    async def rpush(self, key: str, *values: Any) -> int:
+        self.lists[key].extend(str(value) for value in values)
+        return len(self.lists[key])
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        self.ttls[key] = seconds
+        return key in self.strings or key in self.lists
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            deleted += self.strings.pop(key, None) is not None
+            deleted += self.lists.pop(key, None) is not None
+            self.ttls.pop(key, None)
+        return deleted
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class FakePipeline:
+    """
+    Queues commands and runs them back to back on execute().
+
+    After watch() commands run immediately until multi(), like redis-py.
+    Watched keys are not tracked; nothing else writes between the awaits of
+    a single benchmark session's fold.
+    """
+
+    def __init__(self, redis_client: FakeRedis) -> None:
+        self.redis_client = redis_client
+        self.commands: List[Any] = []
+        self.immediate = False
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.reset()
+
+    async def watch(self, *keys: str) -> None:
+        self.immediate = True
+
+    def multi(self) -> None:
+        self.immediate = False
+
+    async def reset(self) -> None:
+        self.commands = []
+        self.immediate = False
+
+    def __getattr__(self, name: str):
+        command = getattr(self.redis_client, name)
+        if self.immediate:
+            return command
+
+        def queue(*args, **kwargs) -> "FakePipeline":
+            self.commands.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> List[Any]:
+        commands, self.commands = self.commands, []
+        return [await command(*args, **kwargs) for command, args, kwargs in commands]
+
+
+class FakeConnectionPool:
+    """Replaces redis.asyncio.BlockingConnectionPool in the app lifespan."""
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "FakeConnectionPool":
+        return cls()
+
+    async def disconnect(self) -> None:
+        pass
@@ -0,0 +1,267 @@
+"""
+Offline load test for the WebSocket chat endpoint.
+
+Boots the FastAPI app under uvicorn with a scripted fake Gemini client, an
+in-process Redis stand-in and a throwaway SQLite database, then drives N
+concurrent sessions through /ws/{session_id} and prints a JSON report with
+throughput, turn latency percentiles and event-loop lag of the server.
+
+Run from the backend directory:
+
+    python -m benchmarks.load_test --sessions 50 --turns 5 --output report.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Dict, List
+
+from benchmarks.fakes import FakeConnectionPool, FakeGenaiClient, FakeRedis
+from benchmarks.report import percentiles
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5, help="Messages per session")
+    parser.add_argument(
+        "--first-token-latency",
+        type=float,
+        default=0.3,
+        help="Mean seconds until the fake model answers",
+    )
+    parser.add_argument(
+        "--chunk-latency",
+        type=float,
+        default=0.05,
+        help="Mean seconds between streamed chunks",
+    )
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument(
+        "--think-time", type=float, default=0.0, help="Seconds between turns"
+    )
+    parser.add_argument(
+        "--fast-path",
+        action="store_true",
+        help="Leave the fast-path router on (off by default so every turn "
+        "reaches the model)",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args()
+
+
+def scripted_messages(rng: random.Random, turns: int) -> List[str]:
+    """A session's messages: small talk, availability checks and bookings."""
+    messages = []
+    for _ in range(turns):
+        day = (date.today() + timedelta(days=rng.randint(1, 60))).isoformat()
+        hour = rng.randint(9, 16)
+        messages.append(
+            rng.choice(
+                [
+                    "Hi, what can you do?",
+                    f"Is {day} available?",
+                    f"Please book {hour}:00 on {day} for Load Test",
+                ]
+            )
+        )
+    return messages
+
+
+class LoopLagMonitor:
+    """Measures how late the server loop wakes up from a short sleep."""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.samples: List[float] = []
+        self._stopped = False
+
+    async def run(self) -> None:
+        while not self._stopped:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(
+                max(0.0, time.perf_counter() - started - self.interval)
+            )
+
+    def stop(self) -> None:
+        self._stopped = True
+
+
+async def run_session(
+    url: str, messages: List[str], think_time: float, latencies: List[float]
+) -> int:
+    """
+    Send messages one at a time and wait for each complete reply.
+
+    Returns:
+        Number of turns that ended in an error reply
+    """
+    from websockets.asyncio.client import connect
+
+    errors = 0
+    async with connect(url) as websocket:
+        await websocket.recv()  # Welcome message
+
+        for turn, message in enumerate(messages):
+            if turn and think_time:
+                await asyncio.sleep(think_time)
+
+            started = time.perf_counter()
+            await websocket.send(message)
+            reply = ""
+            while True:
+                raw = await websocket.recv()
+                try:
+                    frame = json.loads(raw)
+                except ValueError:
+                    frame = None
+                if not isinstance(frame, dict):
+                    # Plain text: non-streaming reply or an error
+                    reply = raw
+                    break
+                if frame["type"] == "chunk":
+                    reply += frame["text"]
+                elif frame["type"] == "end":
+                    break
+            latencies.append(time.perf_counter() - started)
+
+            # Tool failures are wrapped in normal replies and counted separately
+            if reply.startswith(("Error", "I apologize")):
+                errors += 1
+    return errors
+
+
+def start_server(app, monitor: LoopLagMonitor):
+    """Run uvicorn on its own loop in a thread so client load is not measured."""
+    import uvicorn
+
+    config = uvicorn.Config(
+        app, host="127.0.0.1", port=0, log_level="warning", lifespan="on"
+    )
+    server = uvicorn.Server(config)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(
+        target=loop.run_until_complete, args=(server.serve(),), daemon=True
+    )
+    thread.start()
+
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Server failed to start")
+        time.sleep(0.05)
+
+    asyncio.run_coroutine_threadsafe(monitor.run(), loop)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, thread, port
+
+
+def tool_errors() -> float:
+    """Tool calls that failed so far, including errors the model only relayed."""
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value("booking_errors_total", {"stage": "tool"}) or 0
+
+
+async def drive(args: argparse.Namespace, port: int) -> Dict:
+    rng = random.Random(args.seed)
+    latencies: List[float] = []
+    run_id = uuid.uuid4().hex[:8]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            run_session(
+                f"ws://127.0.0.1:{port}/ws/bench-{run_id}-{index}",
+                scripted_messages(rng, args.turns),
+                args.think_time,
+                latencies,
+            )
+            for index in range(args.sessions)
+        ),
+        return_exceptions=True,
+    )
+    duration = time.perf_counter() - started
+
+    failed_sessions = [r for r in results if isinstance(r, BaseException)]
+    return {
+        "duration_seconds": duration,
+        "turns": len(latencies),
+        "error_turns": sum(r for r in results if isinstance(r, int)),
+        "failed_sessions": len(failed_sessions),
+        "session_errors": sorted({repr(e) for e in failed_sessions})[:5],
+        "throughput_turns_per_second": len(latencies) / duration if duration else 0,
+        "turn_latency_seconds": percentiles(latencies),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configuration is read at import time, so set it before importing the app
+        database_path = os.path.join(tmp, "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        os.environ.setdefault("GEMINI_CONTEXT_CACHE", "false")
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        os.environ["FAST_PATH_ENABLED"] = "true" if args.fast_path else "false"
+        # Every simulated session connects from the same address
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        # The Redis stand-in has neither scripts nor pub/sub
+        for name in ("SESSION_BUS", "AVAILABILITY_CACHE_SHARED", "RATE_LIMIT_SHARED"):
+            os.environ[name] = "false"
+
+        import main as app_module
+        from agent import ChatClient
+
+        genai_client = FakeGenaiClient(
+            first_token_latency=args.first_token_latency,
+            chunk_latency=args.chunk_latency,
+            jitter=args.jitter,
+            seed=args.seed,
+        )
+        ChatClient.create_genai_client = classmethod(lambda cls: genai_client)
+        app_module.BlockingConnectionPool = FakeConnectionPool
+        app_module.Redis = FakeRedis
+
+        monitor = LoopLagMonitor()
+        server, thread, port = start_server(app_module.app, monitor)
+        errors_before = tool_errors()
+        try:
+            report = asyncio.run(drive(args, port))
+            report["tool_errors"] = int(tool_errors() - errors_before)
+        finally:
+            monitor.stop()
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    report["event_loop_lag_seconds"] = percentiles(monitor.samples)
+    report["model_calls"] = genai_client.calls
+    report["llm"] = {
+        "admission": ChatClient.LLM_LIMITER.stats(),
+        "resilience": ChatClient.GEMINI_CALLER.stats(),
+    }
+    report["config"] = {
+        key: value for key, value in vars(args).items() if key != "output"
+    } | {"database_url": os.environ["DATABASE_URL"]}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    sys.exit(1 if report["failed_sessions"] or report["tool_errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import re
+from typing import Optional
+
+# Seconds to wait for more messages before starting a turn. The actual wait
+# adapts between the two; MESSAGE_DEBOUNCE_MAX=0 starts turns immediately.
+MESSAGE_DEBOUNCE_MIN = float(os.getenv("MESSAGE_DEBOUNCE_MIN", "0.15"))
+MESSAGE_DEBOUNCE_MAX = float(os.getenv("MESSAGE_DEBOUNCE_MAX", "1.5"))
+
+# Messages that carry booking details or correct the previous request. Anything
+# else ("ok", "thanks", "my name is Sam") is answered after the turn in flight.
+# Times such as "3pm" are caught by the digit, so "am"/"pm" are not words here.
+INTENT_CHANGE_PATTERN = re.compile(
+    r"\d|\b("
+    r"no|not|don'?t|actually|instead|change|cancel|wait|wrong|sorry|rather|"
+    r"other|another|different|book|booking|reserve|available|availability|"
+    r"free|slot|slots|today|tomorrow|tonight|next|week|weekend|morning|"
+    r"afternoon|evening|noon|monday|tuesday|wednesday|thursday|friday|"
+    r"saturday|sunday"
+    r")\b",
+    re.IGNORECASE,
+)
+
+
+class MessageCoalescer:
+    """
+    Per-session debounce policy for bursts of short messages.
+
+    Users often split one request over several quick lines. Instead of
+    starting a model turn for every line, the session waits a short window
+    after each message and answers the whole burst at once. The window
+    adapts to the user: it stays at min_window for users who send one message
+    at a time and grows towards 1.5x their typical gap within bursts, capped
+    at max_window measured from the first message of the burst.
+    """
+
+    # Weight of the newest observation in the moving averages
+    SMOOTHING = 0.3
+    # Share of messages arriving within a burst above which we wait longer
+    BURST_THRESHOLD = 0.2
+
+    def __init__(self, min_window: float, max_window: float) -> None:
+        """
+        Initialize the coalescer.
+
+        Args:
+            min_window: Shortest wait after a message in seconds
+            max_window: Longest wait for a burst in seconds; 0 disables debouncing
+        """
+        self.min_window = min(min_window, max_window)
+        self.max_window = max_window
+        self.gap_average: Optional[float] = None
+        self.burst_share = 0.0
+        self.last_message_at: Optional[float] = None
+
+    def observe(self, now: float) -> None:
+        """
+        Record the arrival of a message.
+
+        Args:
+            now: Monotonic arrival time in seconds
+        """
+        if self.last_message_at is not None:
+            gap = now - self.last_message_at
+            in_burst = gap <= self.max_window
+            self.burst_share += self.SMOOTHING * (in_burst - self.burst_share)
+            if in_burst:
+                self.gap_average = (
+                    gap
+                    if self.gap_average is None
+                    else self.gap_average + self.SMOOTHING * (gap - self.gap_average)
+                )
+        self.last_message_at = now
+
+    def window(self) -> float:
+        """Current wait after a message, based on this user's typing pattern."""
+        if self.max_window <= 0:
+            return 0.0
+        if self.gap_average is None or self.burst_share < self.BURST_THRESHOLD:
+            return self.min_window
+        return min(self.max_window, max(self.min_window, 1.5 * self.gap_average))
+
+    def delay(self, burst_started_at: float, now: float) -> float:
+        """
+        Seconds to wait before answering the buffered messages.
+
+        Args:
+            burst_started_at: Arrival time of the oldest unanswered message
+            now: Arrival time of the newest message
+
+        Returns:
+            The adaptive window, shortened so a burst never waits longer than
+            max_window in total
+        """
+        return max(0.0, min(self.window(), burst_started_at + self.max_window - now))
+
+    @staticmethod
+    def changes_intent(message: str) -> bool:
+        """
+        Whether a message should interrupt the turn already talking to the model.
+
+        Args:
+            message: Message that arrived while a turn was in flight
+
+        Returns:
+            True if it carries booking details or corrects the request
+        """
+        return bool(INTENT_CHANGE_PATTERN.search(message))
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from typing import Optional
+
+from google import genai
+from google.genai import types
+from logs import get_logger
+
+logger = get_logger("context_cache")
+
+
+class GeminiContextCache:
+    """
+    Process-wide Gemini cached content for the static prompt prefix.
+
+    The system instruction and tool declarations are identical for every
+    request, so they are registered once as a cached content object and
+    referenced by name in GenerateContentConfig. The cache is refreshed
+    shortly before its TTL runs out. If the cache cannot be created (for
+    example when the prefix is below the model's minimum cacheable size),
+    callers get None and fall back to sending the prefix inline.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        system_instruction: str,
+        tools: types.Tool,
+        ttl_seconds: int,
+        refresh_margin_seconds: int = 300,
+        retry_after_seconds: int = 60,
+    ) -> None:
+        """
+        Initialize the cache manager. Nothing is created until first use.
+
+        Args:
+            model: Model the cached content is bound to
+            system_instruction: Static system instruction to cache
+            tools: Tool declarations to cache
+            ttl_seconds: Lifetime requested for the cached content
+            refresh_margin_seconds: Refresh when less than this remains
+            retry_after_seconds: Back-off after a failed create or refresh
+        """
+        self.model = model
+        self.system_instruction = system_instruction
+        self.tools = tools
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_after_seconds = retry_after_seconds
+
+        self._name: Optional[str] = None
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _valid_name(self, now: float) -> Optional[str]:
+        """Return the cache name if it has not expired yet."""
+        if self._name and now < self._expires_at:
+            return self._name
+        return None
+
+    async def get_name(self, client: genai.Client) -> Optional[str]:
+        """
+        Return the name of a live cached content object, creating or
+        refreshing it when needed.
+
+        Args:
+            client: Gemini client used to manage the cache
+
+        Returns:
+            Cached content name, or None if no cache is available
+        """
+        now = time.time()
+        if self._name and now < self._expires_at - self.refresh_margin_seconds:
+            return self._name
+
+        # Another request is already refreshing, keep using the current cache
+        if self._lock.locked() or now < self._retry_at:
+            return self._valid_name(now)
+
+        async with self._lock:
+            now = time.time()
+            if self._name and now < self._expires_at - self.refresh_margin_seconds:
+                return self._name
+
+            try:
+                if self._valid_name(now):
+                    cached = await client.aio.caches.update(
+                        name=self._name,
+                        config=types.UpdateCachedContentConfig(
+                            ttl=f"{self.ttl_seconds}s"
+                        ),
+                    )
+                    logger.info("Refreshed %s", cached.name)
+                else:
+                    cached = await client.aio.caches.create(
+                        model=self.model,
+                        config=types.CreateCachedContentConfig(
+                            display_name="booking-agent-prefix",
+                            system_instruction=self.system_instruction,
+                            tools=[self.tools],
+                            ttl=f"{self.ttl_seconds}s",
+                        ),
+                    )
+                    logger.info("Created %s", cached.name)
+
+                self._name = cached.name
+                self._expires_at = (
+                    cached.expire_time.timestamp()
+                    if cached.expire_time
+                    else now + self.ttl_seconds
+                )
+            except Exception as e:
+                logger.error("Error creating or refreshing cache: %s", e)
+                self._retry_at = now + self.retry_after_seconds
+                return self._valid_name(now)
+
+        return self._name
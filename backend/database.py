@@ -3,12 +3,26 @@ from datetime import datetime
 from typing import Annotated
 
 from fastapi import Depends
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Field, Session, SQLModel, create_engine
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///booking_db.db")
 
+# Async driver URL, derived from DATABASE_URL unless set explicitly
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1).replace(
+        "sqlite://", "sqlite+aiosqlite://", 1
+    ),
+)
+# Set DB_ASYNC=false to run the sync tools in a bounded thread pool instead
+DB_ASYNC_ENABLED = os.getenv("DB_ASYNC", "true").lower() == "true"
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "8"))
+
 engine = create_engine(DATABASE_URL)
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL) if DB_ASYNC_ENABLED else None
+
 
 def init_db():
     SQLModel.metadata.create_all(engine)
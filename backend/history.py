@@ -0,0 +1,218 @@
+import json
+from typing import Dict, List, NamedTuple, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import WatchError
+
+
+class HistoryWindow(NamedTuple):
+    """The tail of a conversation plus a summary of what came before it."""
+
+    summary: Optional[str]
+    messages: List[Dict[str, str]]
+    # Stored messages older than the window that are not yet summarized
+    overflow: int
+
+
+class RedisHistoryStore:
+    """
+    Append-only conversation history backed by a Redis list.
+
+    Each message is stored as its own JSON-encoded list element, so appending
+    a turn is a single RPUSH instead of a read-modify-write of the whole
+    history. The TTL is refreshed in the same pipeline as every write.
+
+    Older messages can be folded into a rolling summary kept under
+    ``chat:{session_id}:summary``: the summary is written and the folded
+    messages are trimmed from the head of the list in one transaction, which
+    is skipped if another connection of the session folded them first.
+
+    Sessions created before the list layout stored their history as one JSON
+    blob under ``chat:{session_id}``. Those keys are migrated into the list
+    the first time the history is read or appended to.
+    """
+
+    def __init__(self, redis_client: Redis, session_id: str, ttl: int) -> None:
+        """
+        Initialize the history store for a session.
+
+        Args:
+            redis_client: Shared async Redis client used for all history operations
+            session_id: Unique identifier for the client session
+            ttl: Expiration of the history key in seconds
+        """
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.legacy_key = f"chat:{session_id}"
+        self.key = f"chat:{session_id}:messages"
+        self.summary_key = f"chat:{session_id}:summary"
+
+    async def load(self) -> List[Dict[str, str]]:
+        """
+        Read the full history, migrating a legacy JSON blob if present.
+
+        Returns:
+            List of message dictionaries with 'role' and 'content' keys
+        """
+        entries = await self.redis_client.lrange(self.key, 0, -1)
+        if entries:
+            return [json.loads(entry) for entry in entries]
+        return await self._migrate_legacy()
+
+    async def load_window(self, max_messages: int) -> HistoryWindow:
+        """
+        Read the summary and the newest messages in one round-trip.
+
+        Args:
+            max_messages: Number of most recent messages to return
+
+        Returns:
+            HistoryWindow with the summary (if any), the newest messages and
+            the number of older messages left out of the window
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.llen(self.key)
+        pipe.lrange(self.key, -max_messages, -1)
+        pipe.get(self.summary_key)
+        length, entries, summary = await pipe.execute()
+
+        if not length:
+            history = await self._migrate_legacy()
+            return HistoryWindow(
+                summary,
+                history[-max_messages:],
+                max(0, len(history) - max_messages),
+            )
+
+        return HistoryWindow(
+            summary,
+            [json.loads(entry) for entry in entries],
+            max(0, length - max_messages),
+        )
+
+    async def load_oldest(self, count: int) -> List[Dict[str, str]]:
+        """
+        Read the oldest messages of the list.
+
+        Args:
+            count: Number of messages to read from the head
+
+        Returns:
+            List of message dictionaries, oldest first
+        """
+        entries = await self.redis_client.lrange(self.key, 0, count - 1)
+        return [json.loads(entry) for entry in entries]
+
+    async def fold(
+        self,
+        summary: str,
+        folded: List[Dict[str, str]],
+        previous_summary: Optional[str],
+    ) -> bool:
+        """
+        Replace the oldest messages with a summary.
+
+        The fold only applies if the summary and the head of the list are
+        still the ones the new summary was built from. Otherwise another
+        connection of the same session folded them already, and trimming
+        again would drop turns that no summary covers.
+
+        Args:
+            summary: Summary covering the previous summary and the messages
+            folded: Messages from the head of the list the summary covers
+            previous_summary: Summary the new one was built from, if any
+
+        Returns:
+            True if the messages were folded, False if the history changed
+        """
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(self.key, self.summary_key)
+                current_summary = await pipe.get(self.summary_key)
+                length = await pipe.llen(self.key)
+                head = await pipe.lindex(self.key, 0)
+                if (
+                    current_summary != previous_summary
+                    or length < len(folded)
+                    or head is None
+                    or json.loads(head) != folded[0]
+                ):
+                    return False
+
+                pipe.multi()
+                pipe.set(self.summary_key, summary, ex=self.ttl)
+                pipe.ltrim(self.key, len(folded), -1)
+                pipe.expire(self.key, self.ttl)
+                await pipe.execute()
+            except WatchError:
+                # Written meanwhile; the next refresh retries with fresh state
+                return False
+        return True
+
+    async def append(self, *messages: Dict[str, str]) -> None:
+        """
+        Append one or more messages and refresh the TTL in one round-trip.
+
+        Args:
+            messages: Message dictionaries with 'role' and 'content' keys
+        """
+        if not messages:
+            return
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.rpush(self.key, *(json.dumps(message) for message in messages))
+        pipe.expire(self.key, self.ttl)
+        pipe.expire(self.summary_key, self.ttl)
+        length, *_ = await pipe.execute()
+
+        # The list did not exist before, e.g. a fast-path reply was saved
+        # without reading the history first
+        if length == len(messages):
+            await self._prepend_legacy()
+
+    async def replace(self, history: List[Dict[str, str]]) -> None:
+        """
+        Overwrite the stored history with the given messages.
+
+        Args:
+            history: List of message dictionaries to store
+        """
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(self.key, self.legacy_key, self.summary_key)
+        if history:
+            pipe.rpush(self.key, *(json.dumps(message) for message in history))
+            pipe.expire(self.key, self.ttl)
+        await pipe.execute()
+
+    async def clear(self) -> None:
+        """Delete the history, its summary and any unmigrated legacy key."""
+        await self.redis_client.delete(self.key, self.legacy_key, self.summary_key)
+
+    async def _migrate_legacy(self) -> List[Dict[str, str]]:
+        """
+        Move a legacy JSON-blob history into the list layout.
+
+        Returns:
+            The migrated history, or an empty list if there was none
+        """
+        history_json = await self.redis_client.get(self.legacy_key)
+        if not history_json:
+            return []
+
+        history = json.loads(history_json)
+        await self.replace(history)
+        return history
+
+    async def _prepend_legacy(self) -> None:
+        """Move a legacy JSON-blob history in front of the list."""
+        # GETDEL so concurrent writers cannot migrate the blob twice
+        history_json = await self.redis_client.getdel(self.legacy_key)
+        if not history_json:
+            return
+
+        history = json.loads(history_json)
+        if not history:
+            return
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.lpush(self.key, *(json.dumps(message) for message in reversed(history)))
+        pipe.expire(self.key, self.ttl)
+        await pipe.execute()
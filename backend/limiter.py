@@ -0,0 +1,177 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+from metrics import LLM_QUEUE_WAIT_SECONDS, LLM_REJECTIONS
+
+
+class LLMBusyError(Exception):
+    """Raised when a model call cannot be admitted right now."""
+
+
+class LLMLimiter:
+    """
+    Global cap on concurrent Gemini calls with fair per-session queueing.
+
+    At most max_concurrent calls run at once. Further calls wait in one FIFO
+    queue per session, and freed slots are handed out round-robin across
+    sessions so one chatty session cannot starve the others. A call is
+    rejected with LLMBusyError when max_queue calls are already waiting or
+    when it waits longer than queue_timeout seconds.
+    """
+
+    def __init__(
+        self, max_concurrent: int, max_queue: int, queue_timeout: float
+    ) -> None:
+        """
+        Initialize the limiter.
+
+        Args:
+            max_concurrent: Maximum number of in-flight model calls
+            max_queue: Maximum number of waiting calls before rejecting
+            queue_timeout: Maximum seconds a call may wait for a slot
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._available = max_concurrent
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._waiting = 0
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def slot(
+        self, session_id: str, reject_when_full: bool = True
+    ) -> AsyncIterator[None]:
+        """
+        Hold one model-call slot for the duration of the block.
+
+        Args:
+            session_id: Session the call belongs to, used for fair queueing
+            reject_when_full: Raise immediately if the queue is full. Follow-up
+                calls inside an already admitted turn pass False so a turn is
+                not abandoned halfway.
+
+        Raises:
+            LLMBusyError: If the call is not admitted
+        """
+        await self._acquire(session_id, reject_when_full)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def try_acquire(self) -> bool:
+        """
+        Take a free slot without waiting; the caller must release() it.
+
+        Only succeeds if no call is queued, so opportunistic extra calls such
+        as hedged requests never delay calls that are waiting.
+
+        Returns:
+            True if a slot was taken
+        """
+        if self._available > 0 and not self._waiting:
+            self._available -= 1
+            self._record_wait(0.0)
+            return True
+        return False
+
+    def release(self) -> None:
+        """Give back a slot taken with try_acquire()."""
+        self._release()
+
+    async def _acquire(self, session_id: str, reject_when_full: bool) -> None:
+        if self._available > 0 and not self._waiting:
+            self._available -= 1
+            self._record_wait(0.0)
+            return
+
+        if reject_when_full and self._waiting >= self.max_queue:
+            self.rejected += 1
+            LLM_REJECTIONS.labels("queue_full").inc()
+            raise LLMBusyError("Model call queue is full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(session_id, deque()).append(waiter)
+        self._waiting += 1
+        started = time.monotonic()
+
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await waiter
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up, pass it on
+                self._release()
+            else:
+                self._remove_waiter(session_id, waiter)
+            if isinstance(e, TimeoutError):
+                self.timeouts += 1
+                LLM_REJECTIONS.labels("timeout").inc()
+                raise LLMBusyError("Timed out waiting for a model call slot") from e
+            raise
+
+        self._record_wait(time.monotonic() - started)
+
+    def _release(self) -> None:
+        """Hand the slot to the next session in round-robin order, or free it."""
+        while self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._waiting -= 1
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self._available += 1
+
+    def _remove_waiter(self, session_id: str, waiter: asyncio.Future) -> None:
+        queue = self._queues.get(session_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self._waiting -= 1
+            if not queue:
+                del self._queues[session_id]
+
+    def _record_wait(self, wait_seconds: float) -> None:
+        self.admitted += 1
+        self.wait_seconds_total += wait_seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+        LLM_QUEUE_WAIT_SECONDS.observe(wait_seconds)
+
+    @property
+    def in_flight(self) -> int:
+        return self.max_concurrent - self._available
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def stats(self) -> Dict[str, float]:
+        """Snapshot of limiter metrics."""
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+            "wait_seconds_avg": (
+                self.wait_seconds_total / self.admitted if self.admitted else 0.0
+            ),
+        }
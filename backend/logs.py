@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for log shippers, "text" for reading in a terminal
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# User messages, tool arguments/results and model replies are only logged
+# when enabled, and then only for a sampled fraction of events
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "false").lower() == "true"
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+
+ROOT_LOGGER_NAME = "booking"
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", (), None)).keys()
+) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the `extra` fields at the top level."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with the `extra` fields appended as key=value."""
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(
+            f"{key}={value}"
+            for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES
+        )
+        return f"{line} {fields}" if fields else line
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a logger below the application root logger."""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def session_logger(logger: logging.Logger, session_id: str) -> logging.LoggerAdapter:
+    """Wrap a logger so every record carries the session id."""
+    return logging.LoggerAdapter(logger, {"session_id": session_id}, merge_extra=True)
+
+
+def payload_enabled(logger: logging.Logger | logging.LoggerAdapter) -> bool:
+    """
+    Whether a payload-carrying log event should be emitted.
+
+    Check this before building the log call so disabled or sampled-out
+    events cost neither formatting nor record creation.
+    """
+    if not LOG_PAYLOADS or not logger.isEnabledFor(logging.INFO):
+        return False
+    return LOG_PAYLOAD_SAMPLE_RATE >= 1.0 or random.random() < LOG_PAYLOAD_SAMPLE_RATE
+
+
+def log_payload(
+    logger: logging.Logger | logging.LoggerAdapter, msg: str, **fields: object
+) -> None:
+    """
+    Log an INFO event carrying payload fields, if payload logging allows it.
+
+    Fields named like LogRecord attributes ("message", "args", ...) would make
+    the logging module raise, so they are prefixed with "payload_".
+    """
+    if not payload_enabled(logger):
+        return
+    extra = {
+        f"payload_{key}" if key in _RECORD_ATTRIBUTES else key: value
+        for key, value in fields.items()
+    }
+    logger.info(msg, extra=extra)
+
+
+def configure_logging() -> QueueListener:
+    """
+    Route application logs through a queue to a background writer thread.
+
+    The event loop merges each record's arguments into its message and
+    enqueues it (QueueHandler.prepare); the JSON or text formatting and the
+    blocking write to stdout happen on the listener thread.
+
+    Returns:
+        The started listener, stopped again by stop_logging()
+    """
+    global _listener
+
+    if _listener is not None:
+        return _listener
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(
+        JsonFormatter() if LOG_FORMAT == "json" else TextFormatter()
+    )
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(LOG_LEVEL)
+    root.handlers = [QueueHandler(log_queue)]
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
@@ -1,17 +1,106 @@
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager
 import asyncio
+import time
 
 from agent import ChatClient
-from database import DbSession, init_db
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, WebSocketException, status
+from availability_cache import AVAILABILITY_CACHE_SHARED
+from coalescer import MESSAGE_DEBOUNCE_MAX, MESSAGE_DEBOUNCE_MIN, MessageCoalescer
+from database import DB_ASYNC_ENABLED, async_engine, engine, init_db
+from fastapi import (
+    FastAPI,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from logs import (
+    configure_logging,
+    get_logger,
+    log_payload,
+    session_logger,
+    stop_logging,
+)
+from metrics import (
+    ACTIVE_SESSIONS,
+    CANCELLATIONS,
+    COALESCED_MESSAGES,
+    ERRORS,
+    LLM_IN_FLIGHT,
+    LLM_QUEUE_DEPTH,
+    MESSAGE_SECONDS,
+    THROTTLED_MESSAGES,
+    WASTED_MODEL_CALLS,
+)
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from rate_limit import RATE_LIMIT_SHARED, admit, create_rate_limiters
+from redis.asyncio import BlockingConnectionPool, Redis
+from session_bus import (
+    SESSION_BUS_ENABLED,
+    SESSION_TAKEN_OVER,
+    SessionBus,
+    SessionHub,
+)
+from tools import availability_cache
+from tracing import configure_tracing, shutdown_tracing, tracer
+
+logger = get_logger("websocket")
+
+rate_limiters = create_rate_limiters()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    configure_logging()
+    configure_tracing(engine, async_engine)
     init_db()
+
+    # One bounded Redis pool shared by every WebSocket session.
+    # Sessions wait for a free connection instead of opening new ones.
+    redis_pool = BlockingConnectionPool.from_url(
+        ChatClient.REDIS_URL,
+        max_connections=ChatClient.REDIS_MAX_CONNECTIONS,
+        decode_responses=True,
+    )
+    app.state.redis = Redis(connection_pool=redis_pool)
+
+    if availability_cache and AVAILABILITY_CACHE_SHARED:
+        if DB_ASYNC_ENABLED:
+            availability_cache.attach_redis(app.state.redis)
+        else:
+            # Sync tools run in threads and cannot publish bookings to Redis,
+            # so other workers would keep serving the slots as free
+            logger.warning(
+                "AVAILABILITY_CACHE_SHARED needs DB_ASYNC, using the local cache"
+            )
+
+    if RATE_LIMIT_SHARED:
+        for limiter in rate_limiters:
+            limiter.attach_redis(app.state.redis)
+
+    # One Gemini client, so HTTP connections are reused across sessions
+    app.state.genai = ChatClient.create_genai_client()
+
+    # Replies travel through Redis so any worker can serve a reconnect
+    if SESSION_BUS_ENABLED:
+        app.state.session_hub = SessionHub(app.state.redis)
+        await app.state.session_hub.start()
+
     yield
 
+    if SESSION_BUS_ENABLED:
+        await app.state.session_hub.stop()
+
+    await app.state.genai.aio.aclose()
+    app.state.genai.close()
+    await app.state.redis.aclose()
+    await redis_pool.disconnect()
+    if async_engine is not None:
+        await async_engine.dispose()
+    shutdown_tracing()
+    stop_logging()
+
 
 app = FastAPI(
     title="AI Booking Agent",
@@ -39,57 +128,205 @@ async def health_check():
     return {"status": "healthy"}
 
 
+# Sampled from the shared limiter at scrape time
+LLM_IN_FLIGHT.set_function(lambda: ChatClient.LLM_LIMITER.in_flight)
+LLM_QUEUE_DEPTH.set_function(lambda: ChatClient.LLM_LIMITER.queue_depth)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics endpoint."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/stats/fast-path")
+async def fast_path_stats():
+    """Fast-path router hit counts, i.e. model calls saved."""
+    router = ChatClient.FAST_PATH_ROUTER
+    if router is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "counts": dict(router.stats),
+        "hit_rate": router.hit_rate(),
+    }
+
+
+@app.get("/stats/llm")
+async def llm_stats():
+    """Gemini admission control, retries, hedges and circuit breaker state."""
+    return {
+        "admission": ChatClient.LLM_LIMITER.stats(),
+        "resilience": ChatClient.GEMINI_CALLER.stats(),
+    }
+
+
 @app.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str, db: DbSession):
+async def websocket_endpoint(websocket: WebSocket, session_id: str):
     """
     WebSocket endpoint for real-time chat.
 
     Args:
         websocket: WebSocket connection
         session_id: Unique client identifier for session management
-        db: DbSession to query database for context
     """
     await websocket.accept()
-    print(f"[WebSocket] Client {session_id} connected")
+    ACTIVE_SESSIONS.inc()
+    log = session_logger(logger, session_id)
+    log.info("Client connected")
 
     # Create chat client instance for this connection
-    chat_client = ChatClient(session_id, db)
+    chat_client = ChatClient(
+        session_id, websocket.app.state.redis, websocket.app.state.genai
+    )
+
+    # Replies go to the session bus when enabled, and from there to whichever
+    # connection currently owns the session
+    bus = None
+    delivery_task = None
+
+    # Track the current processing task to allow cancellation
+    processing_task = None
+    current_message_buffer = []
+    coalescer = MessageCoalescer(MESSAGE_DEBOUNCE_MIN, MESSAGE_DEBOUNCE_MAX)
+    burst_started_at = 0.0
+    # False while a turn is still waiting out its debounce window
+    turn_in_flight = False
+
+    turn_counter = 0
+
+    # Token buckets for this session and for everything from its address
+    rate_limit_keys = {
+        "session": session_id,
+        "ip": websocket.client.host if websocket.client else "unknown",
+    }
+    throttle_notified = False
 
     try:
+        if SESSION_BUS_ENABLED:
+            session_bus = SessionBus(websocket.app.state.session_hub, session_id)
+            await session_bus.claim()
+            bus = session_bus
+        outbox = bus or websocket
+
         # Send welcome message
         await websocket.send_text(
             "Welcome to AI Booking Agent! How can I help you book a time slot today?"
         )
 
-        # Track the current processing task to allow cancellation
-        processing_task = None
-        current_message_buffer = []
+        async def stream_and_respond(messages_to_process: str, turn_id: int):
+            """
+            Forward response chunks as JSON frames while the model generates.
 
-        async def process_and_respond(messages_to_process: str):
+            Frames are {"type": "start" | "chunk" | "end", "turn": turn_id},
+            with the partial text in "text" on chunk frames. A new "start"
+            supersedes any turn that was cancelled before its "end".
+            """
+            await outbox.send_json({"type": "start", "turn": turn_id})
+            async with aclosing(
+                chat_client.process_message_stream(messages_to_process)
+            ) as chunks:
+                async for chunk in chunks:
+                    await outbox.send_json(
+                        {"type": "chunk", "turn": turn_id, "text": chunk}
+                    )
+            await outbox.send_json({"type": "end", "turn": turn_id})
+            log.debug("Streamed turn %d", turn_id)
+
+        async def process_and_respond(messages_to_process: str, turn_id: int):
             """Helper to process message and send response"""
+            with tracer.start_as_current_span("websocket.message") as span:
+                span.set_attribute("session.id", session_id)
+                span.set_attribute("turn", turn_id)
+                span.set_attribute("message.length", len(messages_to_process))
+                started = time.perf_counter()
+                try:
+                    if ChatClient.STREAM_RESPONSES:
+                        await stream_and_respond(messages_to_process, turn_id)
+                    else:
+                        # Process combined message through AI agent
+                        agent_response = await chat_client.process_message(
+                            messages_to_process
+                        )
+
+                        # Send response back as plain text
+                        await outbox.send_text(agent_response)
+                        log_payload(log, "Sent reply", response=agent_response)
+
+                    MESSAGE_SECONDS.observe(time.perf_counter() - started)
+                except asyncio.CancelledError:
+                    span.set_attribute("cancelled", True)
+                    log.info("Processing cancelled (new message arrived)")
+                    raise # Re-raise to let asyncio handle it
+                except Exception as e:
+                    ERRORS.labels("websocket").inc()
+                    log.exception("Error during processing: %s", e)
+                    await outbox.send_text(f"Error: {str(e)}")
+
+        async def next_turn_id() -> int:
+            """Turn ids stay unique across reconnects when replies share a bus"""
+            nonlocal turn_counter
+            if bus:
+                return await bus.next_turn()
+            turn_counter += 1
+            return turn_counter
+
+        async def debounce_and_respond(delay: float):
+            """Wait for the rest of a typing burst, then answer it as one turn"""
+            nonlocal turn_in_flight
+            if delay:
+                await asyncio.sleep(delay)
+            turn_id = await next_turn_id()
+
+            # Messages arriving from now on are answered by a later turn
+            # unless they change the intent of this one
+            turn_in_flight = True
+            consumed = len(current_message_buffer)
+            if consumed > 1:
+                COALESCED_MESSAGES.inc(consumed - 1)
             try:
-                # Process combined message through AI agent
-                agent_response = await chat_client.process_message(messages_to_process)
-                
-                # Send response back as plain text
-                await websocket.send_text(agent_response)
-                print(f"[WebSocket] Sent to {session_id}: '{agent_response}'")
-            except asyncio.CancelledError:
-                print(f"[WebSocket] Processing cancelled for {session_id} (New message arrived)")
-                raise # Re-raise to let asyncio handle it
-            except Exception as e:
-                print(f"[WebSocket] Error during processing: {e}")
-                await websocket.send_text(f"Error: {str(e)}")
+                await process_and_respond(
+                    "\n".join(current_message_buffer[:consumed]), turn_id
+                )
+            except Exception:
+                # A failed turn is not retried, so its messages are done too.
+                # A cancelled one keeps them for the turn that replaces it.
+                del current_message_buffer[:consumed]
+                raise
+            del current_message_buffer[:consumed]
+
+        def start_turn(delay: float):
+            nonlocal processing_task, turn_in_flight
+            turn_in_flight = False
+            processing_task = asyncio.create_task(debounce_and_respond(delay))
+            processing_task.add_done_callback(on_task_done)
 
         def on_task_done(future):
             """Callback when a processing task finishes"""
-            # If the task finished successfully (not cancelled, no exception),
-            # it means it handled all messages currently in the buffer at the time of start.
-            # In this strict cancellation model, if a new message had arrived, 
-            # this task would have been cancelled.
-            # So if it finishes, we can safely clear the buffer.
-            if not future.cancelled() and not future.exception():
-                current_message_buffer.clear()
+            # Messages that arrived while the turn ran without changing its
+            # intent are still buffered; they have waited long enough. The
+            # receive loop may already have started the next turn itself
+            # between the task finishing and this callback running.
+            if (
+                future is processing_task
+                and not future.cancelled()
+                and not future.exception()
+                and current_message_buffer
+            ):
+                start_turn(0.0)
+
+        async def deliver_frames():
+            """Forward bus frames until another connection takes the session over"""
+            async for frame in bus.frames():
+                if "json" in frame:
+                    await websocket.send_json(frame["json"])
+                else:
+                    await websocket.send_text(frame["text"])
+            log.info("Session resumed on another connection")
+            await websocket.close(code=SESSION_TAKEN_OVER)
+
+        if bus:
+            delivery_task = asyncio.create_task(deliver_frames())
 
         # Main message loop
         while True:
@@ -102,32 +339,62 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str, db: DbSessio
             if not new_message.strip():
                 continue
 
-            print(f"[WebSocket] Received from {session_id}: '{new_message}'")
-            
-            # If there is an active task running, cancel it
+            log_payload(log, "Received message", user_message=new_message)
+
+            # Hold back messages beyond the burst, drop them once the wait
+            # grows too long, before they can start or cancel a turn
+            delay, limited_by = await admit(rate_limiters, rate_limit_keys)
+            if delay is None:
+                THROTTLED_MESSAGES.labels(limited_by, "dropped").inc()
+                log.warning("Dropped message over the %s rate limit", limited_by)
+                if not throttle_notified:
+                    throttle_notified = True
+                    await websocket.send_text(
+                        "You're sending messages too quickly. Please wait a "
+                        "moment before sending more."
+                    )
+                continue
+            throttle_notified = False
+            if delay:
+                THROTTLED_MESSAGES.labels(limited_by, "delayed").inc()
+                await asyncio.sleep(delay)
+
+            now = time.monotonic()
+            coalescer.observe(now)
+
             if processing_task and not processing_task.done():
-                print(f"[WebSocket] Cancelling previous task for {session_id}")
+                if turn_in_flight and not coalescer.changes_intent(new_message):
+                    # Answered by a follow-up turn once this one is done
+                    current_message_buffer.append(new_message)
+                    continue
+
+                # Restart the debounce window, or drop a turn whose request
+                # the new message changes
+                if turn_in_flight:
+                    log.debug("Cancelling previous task")
+                    CANCELLATIONS.inc()
                 processing_task.cancel()
                 try:
-                    await processing_task 
+                    await processing_task
                 except asyncio.CancelledError:
                     pass # Expected
-            
-            # Add to buffer
+                if turn_in_flight:
+                    WASTED_MODEL_CALLS.inc(chat_client.turn_model_calls)
+
+            # Add to buffer; all pending messages are answered together
+            if not current_message_buffer:
+                burst_started_at = now
             current_message_buffer.append(new_message)
-            
-            # Combine all pending messages
-            full_context = "\n".join(current_message_buffer)
-            
-            # Start new processing task
-            processing_task = asyncio.create_task(process_and_respond(full_context))
-            processing_task.add_done_callback(on_task_done)
+
+            # Start new processing task after the debounce window
+            start_turn(coalescer.delay(burst_started_at, now))
 
     except WebSocketDisconnect:
-        print(f"[WebSocket] Client {session_id} disconnected normally")
+        log.info("Client disconnected normally")
 
     except Exception as e:
-        print(f"[WebSocket] Error with client {session_id}: {e}")
+        ERRORS.labels("websocket").inc()
+        log.exception("Error with client: %s", e)
         try:
             await websocket.send_text(f"An error occurred: {str(e)}")
         except:
@@ -138,8 +405,18 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str, db: DbSessio
 
     finally:
         # Cleanup
-        db.close()
-        print(f"[WebSocket] Session ended for {session_id}")
+        if bus:
+            # An in-flight turn keeps publishing; a reconnect picks up its reply
+            if delivery_task:
+                delivery_task.cancel()
+            try:
+                await bus.release()
+            except Exception as e:
+                log.warning("Error releasing session: %s", e)
+        elif processing_task and not processing_task.done():
+            processing_task.cancel()
+        ACTIVE_SESSIONS.dec()
+        log.info("Session ended")
 
 
 if __name__ == "__main__":
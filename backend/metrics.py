@@ -0,0 +1,120 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Buckets sized for network round-trips (Redis, DB) up to slow model turns
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)
+
+HISTORY_SECONDS = Histogram(
+    "booking_history_seconds",
+    "Redis conversation history latency",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+
+GEMINI_CALL_SECONDS = Histogram(
+    "booking_gemini_call_seconds",
+    "Gemini call latency per tool-loop iteration, including stream consumption",
+    ["iteration"],
+    buckets=LATENCY_BUCKETS,
+)
+
+TOOL_SECONDS = Histogram(
+    "booking_tool_seconds",
+    "Tool execution latency, including database time",
+    ["tool"],
+    buckets=LATENCY_BUCKETS,
+)
+
+MESSAGE_SECONDS = Histogram(
+    "booking_message_seconds",
+    "End-to-end latency from receiving a message to sending the full reply",
+    buckets=LATENCY_BUCKETS,
+)
+
+TOOL_ITERATIONS = Counter(
+    "booking_tool_iterations",
+    "Tool-loop iterations that sent tool results back to Gemini",
+)
+
+CANCELLATIONS = Counter(
+    "booking_cancellations",
+    "In-flight turns cancelled because a new message arrived",
+)
+
+WASTED_MODEL_CALLS = Counter(
+    "booking_wasted_model_calls",
+    "Gemini calls made by turns that were cancelled before replying",
+)
+
+COALESCED_MESSAGES = Counter(
+    "booking_coalesced_messages",
+    "Messages answered together with an earlier message of the same burst",
+)
+
+CARRIED_TOOL_RESULTS = Counter(
+    "booking_carried_tool_results",
+    "Tool results of cancelled turns reported by the next turn instead of rerun",
+)
+
+THROTTLED_MESSAGES = Counter(
+    "booking_throttled_messages",
+    "Messages held back or dropped by the rate limiter, by limiting scope",
+    ["scope", "action"],
+)
+
+ERRORS = Counter(
+    "booking_errors",
+    "Errors by stage",
+    ["stage"],
+)
+
+HISTORY_SUMMARIES = Counter(
+    "booking_history_summaries",
+    "Background history summary refreshes by outcome",
+    ["outcome"],
+)
+
+FAST_PATH_ROUTES = Counter(
+    "booking_fast_path_routes",
+    "Messages seen by the fast-path router by outcome",
+    ["outcome"],
+)
+
+ACTIVE_SESSIONS = Gauge(
+    "booking_active_sessions",
+    "Open WebSocket sessions",
+)
+
+LLM_IN_FLIGHT = Gauge(
+    "booking_llm_in_flight",
+    "Gemini calls currently holding a limiter slot",
+)
+
+LLM_QUEUE_DEPTH = Gauge(
+    "booking_llm_queue_depth",
+    "Gemini calls waiting for a limiter slot",
+)
+
+GEMINI_CALL_EVENTS = Counter(
+    "booking_gemini_call_events",
+    "Retries, failures, hedges and circuit breaker events of Gemini calls",
+    ["event"],
+)
+
+GEMINI_BREAKER_STATE = Gauge(
+    "booking_gemini_breaker_state",
+    "Gemini circuit breaker state: 0 closed, 1 half-open, 2 open",
+)
+
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "booking_llm_queue_wait_seconds",
+    "Time Gemini calls waited for a limiter slot, zero when one was free",
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_REJECTIONS = Counter(
+    "booking_llm_rejections",
+    "Gemini calls refused by the limiter, by reason",
+    ["reason"],
+)
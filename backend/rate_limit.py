@@ -0,0 +1,192 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from logs import get_logger
+from redis.asyncio import Redis
+
+logger = get_logger("rate_limit")
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Messages a session may send back to back, and the sustained messages/second
+RATE_LIMIT_SESSION_BURST = float(os.getenv("RATE_LIMIT_SESSION_BURST", "5"))
+RATE_LIMIT_SESSION_RATE = float(os.getenv("RATE_LIMIT_SESSION_RATE", "0.5"))
+# Same for all sessions behind one client address; 0 burst disables a scope
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "20"))
+RATE_LIMIT_IP_RATE = float(os.getenv("RATE_LIMIT_IP_RATE", "2"))
+# Excess messages are held back up to this many seconds, then dropped
+RATE_LIMIT_MAX_DELAY = float(os.getenv("RATE_LIMIT_MAX_DELAY", "2"))
+RATE_LIMIT_SHARED = os.getenv("RATE_LIMIT_SHARED", "false").lower() == "true"
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+
+# Same arithmetic as TokenBucketLimiter.reserve_local on Redis time, so every
+# worker draws from one bucket. Numbers are returned as strings because Redis
+# truncates Lua numbers to integers.
+_RESERVE_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local max_delay = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or burst
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local wait = math.max(0, (1 - tokens) / rate)
+if wait > max_delay then
+    return '-1'
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst + 1) / rate + max_delay))
+return tostring(wait)
+"""
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets for one scope of WebSocket messages, e.g. per session.
+
+    Each key starts with burst tokens and regains rate tokens per second. A
+    message takes one token; when the bucket is empty it may borrow against
+    the next refill, which tells the caller how long to hold the message
+    back, up to max_delay seconds. Beyond that the message is rejected.
+
+    Buckets live in a bounded LRU in memory. Once Redis is attached they are
+    kept under ``ratelimit:{scope}:{key}`` instead, so the limit holds across
+    workers; Redis errors fall back to the local buckets.
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        burst: float,
+        rate: float,
+        max_delay: float,
+        max_entries: int = 10000,
+    ) -> None:
+        """
+        Initialize the limiter with local buckets only.
+
+        Args:
+            scope: Metric label and Redis key prefix, e.g. "session" or "ip"
+            burst: Bucket capacity in messages
+            rate: Refill rate in messages per second
+            max_delay: Longest wait in seconds before a message is rejected
+            max_entries: Maximum number of keys kept in memory
+        """
+        self.scope = scope
+        self.burst = burst
+        self.rate = rate
+        self.max_delay = max_delay
+        self.max_entries = max_entries
+        self.redis_client: Optional[Redis] = None
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+        self._reserve = None
+
+    def attach_redis(self, redis_client: Redis) -> None:
+        """
+        Share the buckets between workers.
+
+        Args:
+            redis_client: Process-wide async Redis client
+        """
+        self.redis_client = redis_client
+        self._reserve = redis_client.register_script(_RESERVE_SCRIPT)
+
+    def reserve_local(self, key: str) -> Optional[float]:
+        """
+        Take a token from the in-memory bucket of a key.
+
+        Args:
+            key: Session ID or client address
+
+        Returns:
+            Seconds to wait before handling the message, or None if it
+            would have to wait longer than max_delay
+        """
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        wait = max(0.0, (1 - tokens) / self.rate)
+        if wait > self.max_delay:
+            return None
+
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        # An evicted key starts over with a full bucket
+        while len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def reserve(self, key: str) -> Optional[float]:
+        """
+        Take a token from the shared bucket of a key, or the local one.
+
+        Args:
+            key: Session ID or client address
+
+        Returns:
+            Seconds to wait before handling the message, or None if it
+            would have to wait longer than max_delay
+        """
+        if not self._reserve:
+            return self.reserve_local(key)
+
+        try:
+            wait = float(
+                await self._reserve(
+                    keys=[f"ratelimit:{self.scope}:{key}"],
+                    args=[self.burst, self.rate, self.max_delay],
+                )
+            )
+        except Exception as e:
+            logger.warning("Error reserving shared token: %s", e)
+            return self.reserve_local(key)
+        return None if wait < 0 else wait
+
+
+def create_rate_limiters() -> List[TokenBucketLimiter]:
+    """
+    Build the message rate limiters from the environment.
+
+    The client address is checked before the session, so a message rejected
+    for its address does not also use up a token of its session.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return []
+    scopes = [
+        ("ip", RATE_LIMIT_IP_BURST, RATE_LIMIT_IP_RATE),
+        ("session", RATE_LIMIT_SESSION_BURST, RATE_LIMIT_SESSION_RATE),
+    ]
+    return [
+        TokenBucketLimiter(
+            scope, burst, rate, RATE_LIMIT_MAX_DELAY, RATE_LIMIT_MAX_KEYS
+        )
+        for scope, burst, rate in scopes
+        if burst > 0 and rate > 0
+    ]
+
+
+async def admit(
+    limiters: List[TokenBucketLimiter], keys: Dict[str, str]
+) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Check a message against every limiter.
+
+    Args:
+        limiters: Limiters from create_rate_limiters
+        keys: Bucket key per scope, e.g. {"ip": "10.0.0.1", "session": "abc"}
+
+    Returns:
+        Seconds to hold the message back (None if it is rejected) and the
+        scope that delayed or rejected it, if any
+    """
+    delay, limited_by = 0.0, None
+    for limiter in limiters:
+        wait = await limiter.reserve(keys[limiter.scope])
+        if wait is None:
+            return None, limiter.scope
+        if wait > delay:
+            delay, limited_by = wait, limiter.scope
+    return delay, limited_by
@@ -0,0 +1,315 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, TypeVar
+
+import httpx
+from google.genai import errors
+from limiter import LLMBusyError, LLMLimiter
+from logs import get_logger
+from metrics import GEMINI_BREAKER_STATE, GEMINI_CALL_EVENTS
+
+T = TypeVar("T")
+
+logger = get_logger("resilience")
+
+# Status codes worth retrying: timeouts, rate limits and server-side errors
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Values of the breaker state gauge
+BREAKER_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(LLMBusyError):
+    """Raised instead of calling the provider while the circuit is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed model call may succeed if repeated."""
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the provider is degraded.
+
+    Opens after failure_threshold consecutive failed calls, rejects calls for
+    reset_timeout seconds, then lets a single trial call through (half-open).
+    A successful trial closes the circuit, a failed one opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.short_circuits = 0
+        self._trial_in_flight = False
+
+    def before_call(self) -> None:
+        """
+        Admit or reject a call.
+
+        Raises:
+            CircuitOpenError: If the circuit is open or a trial is in flight
+        """
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.short_circuits += 1
+                GEMINI_CALL_EVENTS.labels("short_circuit").inc()
+                raise CircuitOpenError("Model provider circuit is open")
+            self.state = "half_open"
+            GEMINI_BREAKER_STATE.set(BREAKER_STATE_VALUES[self.state])
+
+        if self.state == "half_open":
+            if self._trial_in_flight:
+                self.short_circuits += 1
+                GEMINI_CALL_EVENTS.labels("short_circuit").inc()
+                raise CircuitOpenError("Model provider circuit is half-open")
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+        GEMINI_BREAKER_STATE.set(BREAKER_STATE_VALUES[self.state])
+
+    def record_failure(self) -> None:
+        self._trial_in_flight = False
+        self.consecutive_failures += 1
+        tripped = self.consecutive_failures >= self.failure_threshold
+        if self.state == "half_open" or (self.state == "closed" and tripped):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.opens += 1
+            GEMINI_CALL_EVENTS.labels("breaker_open").inc()
+        GEMINI_BREAKER_STATE.set(BREAKER_STATE_VALUES[self.state])
+
+    def record_abort(self) -> None:
+        """A call ended without telling us anything about provider health."""
+        self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies."""
+
+    def __init__(self, window: int) -> None:
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int) -> Optional[float]:
+        """Return the latency percentile, or None until enough samples exist."""
+        if len(self._samples) < max(min_samples, 1):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ResilientCaller:
+    """
+    Retry, hedging and circuit breaking around model calls.
+
+    Retryable failures are retried up to max_attempts times, sleeping with
+    decorrelated jitter between attempts. With hedging enabled, a second
+    identical request is started once the first has been running longer
+    than the observed p95 latency, and whichever finishes first wins. A
+    hedge needs a free slot of the limiter, if one is given, so hedging
+    never exceeds the concurrency cap; without a free slot the call simply
+    keeps waiting for the first request.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        breaker: CircuitBreaker,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+        limiter: Optional[LLMLimiter] = None,
+    ) -> None:
+        """
+        Initialize the caller.
+
+        Args:
+            max_attempts: Attempts per call, including the first
+            base_delay: Minimum back-off between attempts in seconds
+            max_delay: Maximum back-off between attempts in seconds
+            breaker: Circuit breaker shared by all calls
+            hedge: Start a hedged request after the p95 latency
+            hedge_min_samples: Latency samples needed before hedging
+            limiter: Admission control that hedged requests count against
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.limiter = limiter
+        self.latency = LatencyTracker(window=500)
+        # Keeps discard coroutines referenced until they finish
+        self._discards: Set[asyncio.Task] = set()
+
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+
+    async def call(
+        self,
+        make_call: Callable[[], Awaitable[T]],
+        discard: Optional[Callable[[T], Awaitable[None]]] = None,
+    ) -> T:
+        """
+        Run a model call with retries, hedging and the circuit breaker.
+
+        Args:
+            make_call: Factory returning a fresh awaitable for each attempt
+            discard: Releases the result of a request that lost a hedge race,
+                e.g. closes an open response stream
+
+        Returns:
+            Result of the first successful attempt
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            Exception: The last error if the call does not succeed
+        """
+        self.breaker.before_call()
+        self.calls += 1
+        delay = self.base_delay
+
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    if self.hedge:
+                        result = await self._hedged(make_call, discard)
+                    else:
+                        result = await self._timed(make_call)
+                except Exception as e:
+                    if not is_retryable(e):
+                        self.breaker.record_abort()
+                        raise
+                    if attempt == self.max_attempts:
+                        self.failures += 1
+                        GEMINI_CALL_EVENTS.labels("failure").inc()
+                        self.breaker.record_failure()
+                        raise
+
+                    self.retries += 1
+                    GEMINI_CALL_EVENTS.labels("retry").inc()
+                    delay = min(
+                        self.max_delay, random.uniform(self.base_delay, delay * 3)
+                    )
+                    logger.warning(
+                        "Retrying model call in %.2fs (attempt %d failed: %s)",
+                        delay,
+                        attempt,
+                        e,
+                    )
+                    await asyncio.sleep(delay)
+                else:
+                    self.breaker.record_success()
+                    return result
+        except BaseException:
+            self.breaker.record_abort()
+            raise
+
+    async def _timed(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        result = await make_call()
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    async def _hedged(
+        self,
+        make_call: Callable[[], Awaitable[T]],
+        discard: Optional[Callable[[T], Awaitable[None]]],
+    ) -> T:
+        threshold = self.latency.percentile(0.95, self.hedge_min_samples)
+        if threshold is None:
+            return await self._timed(make_call)
+
+        primary = asyncio.ensure_future(self._timed(make_call))
+        tasks = {primary}
+        winner: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if done:
+                winner = primary
+                return primary.result()
+
+            if self.limiter and not self.limiter.try_acquire():
+                self.hedges_skipped += 1
+                GEMINI_CALL_EVENTS.labels("hedge_skipped").inc()
+                winner = primary
+                return await primary
+
+            self.hedges += 1
+            GEMINI_CALL_EVENTS.labels("hedge").inc()
+            hedge = asyncio.ensure_future(self._timed(make_call))
+            if self.limiter:
+                hedge.add_done_callback(lambda _: self.limiter.release())
+            tasks.add(hedge)
+
+            pending = set(tasks)
+            first_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                            GEMINI_CALL_EVENTS.labels("hedge_win").inc()
+                        winner = task
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in tasks:
+                if task is not winner:
+                    # A loser may already hold a result, e.g. when both
+                    # requests finished in the same round
+                    task.cancel()
+                    task.add_done_callback(
+                        lambda lost: self._discard_result(lost, discard)
+                    )
+
+    def _discard_result(
+        self,
+        task: asyncio.Future,
+        discard: Optional[Callable[[T], Awaitable[None]]],
+    ) -> None:
+        """Release the result of a request that lost a hedge race."""
+        if task.cancelled() or task.exception() is not None or discard is None:
+            return
+        closing = asyncio.ensure_future(discard(task.result()))
+        self._discards.add(closing)
+        closing.add_done_callback(self._discards.discard)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of retry, hedge and breaker metrics."""
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedges_skipped": self.hedges_skipped,
+            "latency_p95_seconds": self.latency.percentile(0.95, 1),
+            "breaker_state": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+            "breaker_short_circuits": self.breaker.short_circuits,
+        }
@@ -0,0 +1,153 @@
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Callable, Dict, Optional, Protocol
+
+from tools import book_slot, check_availability
+
+DATE_PATTERN = r"(\d{4}-\d{2}-\d{2})"
+
+AVAILABILITY_PATTERN = re.compile(
+    r"^(?:hi|hello|hey)?[,!\s]*"
+    r"(?:what(?:'s| is| are)?|which|any|show(?: me)?|check|list)?\s*"
+    r"(?:the\s+)?(?:slots?\s+|times?\s+|hours?\s+)?"
+    r"(?:is\s+|are\s+)?"
+    r"(?:free|available|open|availability)\s*"
+    r"(?:slots?\s+|times?\s+|hours?\s+)?"
+    r"(?:on|for)?\s*" + DATE_PATTERN + r"\s*[?.!]*$",
+    re.IGNORECASE,
+)
+
+BOOKING_PATTERN = re.compile(
+    r"^(?:please\s+)?book\s+(?:a\s+slot\s+|me\s+)?(?:on\s+)?" + DATE_PATTERN
+    + r"\s+at\s+(\d{1,2})(?::00)?\s*(am|pm)?\s+for\s+([A-Za-z][A-Za-z .'-]{0,49}?)"
+    r"\s*[.!]*$",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class FastPathMatch:
+    """A message the router can answer without the model."""
+
+    intent: str
+    tool_name: str
+    tool_args: Dict
+    render: Callable[[str], str] = field(repr=False)
+
+
+class MessageRouter(Protocol):
+    """Interface for pre-routers consulted before the model is called."""
+
+    def match(self, message: str) -> Optional[FastPathMatch]: ...
+
+
+def _parse_future_date(date_str: str) -> Optional[date]:
+    """Return the date if it is valid and not in the past."""
+    try:
+        target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+    if target_date < date.today():
+        return None
+    return target_date
+
+
+def _to_24_hour(hour: int, meridiem: Optional[str]) -> Optional[int]:
+    """Convert a spoken hour to 24-hour format within the bookable range."""
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.lower() == "pm" else 0)
+    elif 1 <= hour <= 4:
+        # "at 2" during business hours means 2 PM
+        hour += 12
+    if 9 <= hour <= 16:
+        return hour
+    return None
+
+
+def render_availability(result: str) -> str:
+    """Template for a direct availability answer."""
+    if result.startswith("Available slots"):
+        return f"{result}\n\nWhich time slot would you like to book?"
+    if result.startswith("No slots available"):
+        return f"{result} Would you like to check another date?"
+    return result
+
+
+def render_booking(result: str) -> str:
+    """Template for a direct booking answer."""
+    if result.startswith("✓"):
+        return f"{result}\n\nIs there anything else I can help you with?"
+    return f"{result} Would you like me to check other available times?"
+
+
+class FastPathRouter:
+    """
+    Deterministic pre-router for unambiguous availability and booking requests.
+
+    Only messages that match a strict pattern with a valid, non-past date are
+    routed. Everything else returns None so the caller falls back to the model.
+    Hits and misses are counted per intent to measure saved model calls.
+    """
+
+    def __init__(self) -> None:
+        self.stats: Counter = Counter()
+
+    def match(self, message: str) -> Optional[FastPathMatch]:
+        """
+        Try to answer a message without the model.
+
+        Args:
+            message: The raw user message
+
+        Returns:
+            FastPathMatch describing the tool call, or None to fall back
+        """
+        result = self._match(message.strip())
+        self.stats[result.intent if result else "fallback"] += 1
+        return result
+
+    def _match(self, message: str) -> Optional[FastPathMatch]:
+        match = AVAILABILITY_PATTERN.match(message)
+        if match:
+            date_str = match.group(1)
+            if not _parse_future_date(date_str):
+                return None
+            return FastPathMatch(
+                intent="availability",
+                tool_name=check_availability.__name__,
+                tool_args={"date_str": date_str},
+                render=render_availability,
+            )
+
+        match = BOOKING_PATTERN.match(message)
+        if match:
+            date_str, hour, meridiem, user_name = match.groups()
+            target_date = _parse_future_date(date_str)
+            hour = _to_24_hour(int(hour), meridiem)
+            if not target_date or hour is None:
+                return None
+            if target_date == date.today() and hour <= datetime.now().hour:
+                return None
+            return FastPathMatch(
+                intent="booking",
+                tool_name=book_slot.__name__,
+                tool_args={
+                    "user_name": user_name.strip(),
+                    "date_str": date_str,
+                    "hour": hour,
+                },
+                render=render_booking,
+            )
+
+        return None
+
+    def hit_rate(self) -> float:
+        """Fraction of routed messages answered without the model."""
+        total = sum(self.stats.values())
+        if not total:
+            return 0.0
+        return (total - self.stats["fallback"]) / total
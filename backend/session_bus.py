@@ -0,0 +1,292 @@
+import asyncio
+import json
+import os
+import socket
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from logs import get_logger
+from redis.asyncio import Redis
+
+# Route replies through Redis so any worker can serve a reconnecting session
+SESSION_BUS_ENABLED = os.getenv("SESSION_BUS", "false").lower() == "true"
+# Frames kept per session for replay after a reconnect
+SESSION_STREAM_MAXLEN = int(os.getenv("SESSION_STREAM_MAXLEN", "500"))
+SESSION_STREAM_TTL = int(os.getenv("SESSION_STREAM_TTL", "3600"))
+# Ownership expires unless the connected worker keeps refreshing it
+SESSION_OWNER_TTL = int(os.getenv("SESSION_OWNER_TTL", "60"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Close code telling the client its session was resumed on another connection
+SESSION_TAKEN_OVER = 4000
+
+logger = get_logger("session_bus")
+
+# Append a frame to the session stream and announce it with its stream id in
+# one step, so live delivery and replay agree on ids
+_PUBLISH_SCRIPT = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'frame', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('PUBLISH', KEYS[2], '{"id":"' .. id .. '","frame":' .. ARGV[2] .. '}')
+return id
+"""
+
+# Extend ownership while this connection holds it, or take it back if the key
+# expired without anyone else claiming the session
+_REFRESH_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner == ARGV[1] or not owner then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Delete the owner key only if this connection still owns the session
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _stream_position(frame_id: str) -> Tuple[int, int]:
+    milliseconds, _, sequence = frame_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+class SessionHub:
+    """
+    Process-wide Redis pub/sub listener for the sessions connected here.
+
+    One pub/sub connection per worker carries the frames and control
+    messages of every local session; they are dispatched to per-connection
+    queues instead of each WebSocket holding its own Redis connection.
+    """
+
+    def __init__(self, redis_client: Redis) -> None:
+        self.redis_client = redis_client
+        self.pubsub = redis_client.pubsub()
+        self.queues: Dict[str, Set[asyncio.Queue]] = {}
+        self.publish_script = redis_client.register_script(_PUBLISH_SCRIPT)
+        self.refresh_script = redis_client.register_script(_REFRESH_SCRIPT)
+        self.release_script = redis_client.register_script(_RELEASE_SCRIPT)
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        # Always subscribed, so the reader never polls an idle connection
+        await self.pubsub.subscribe(f"worker:{WORKER_ID}")
+        self._reader = asyncio.create_task(self._read())
+        logger.info("Session bus started on worker %s", WORKER_ID)
+
+    async def stop(self) -> None:
+        if self._reader:
+            self._reader.cancel()
+        await self.pubsub.aclose()
+
+    async def subscribe(self, session_id: str) -> asyncio.Queue:
+        """Receive the frames and control messages of a session."""
+        queue: asyncio.Queue = asyncio.Queue()
+        queues = self.queues.setdefault(session_id, set())
+        if not queues:
+            await self.pubsub.subscribe(SessionBus.channel_for(session_id))
+        queues.add(queue)
+        return queue
+
+    async def unsubscribe(self, session_id: str, queue: asyncio.Queue) -> None:
+        queues = self.queues.get(session_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.queues[session_id]
+            await self.pubsub.unsubscribe(SessionBus.channel_for(session_id))
+
+    async def _read(self) -> None:
+        while True:
+            try:
+                message = await self.pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if not message or not message["channel"].startswith("session:"):
+                    continue
+                session_id = message["channel"].removeprefix("session:")
+                session_id = session_id.removesuffix(":events")
+                payload = json.loads(message["data"])
+                for queue in self.queues.get(session_id, ()):
+                    queue.put_nowait(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error reading session bus: %s", e)
+                await asyncio.sleep(1.0)
+
+
+class SessionBus:
+    """
+    One WebSocket connection's view of its session on the bus.
+
+    Outgoing frames are appended to a Redis Stream per session and announced
+    over pub/sub. The worker currently holding the connection forwards them
+    to the client and records how far it got, so a client that reconnects to
+    any worker receives the rest of a reply that is still being produced by
+    the worker it was connected to before.
+
+    Exposes send_json/send_text like a WebSocket, so turns can write to it
+    unchanged.
+    """
+
+    def __init__(self, hub: SessionHub, session_id: str) -> None:
+        """
+        Initialize the bus for a new connection.
+
+        Args:
+            hub: Process-wide pub/sub listener
+            session_id: Session the connection belongs to
+        """
+        self.hub = hub
+        self.redis_client = hub.redis_client
+        self.session_id = session_id
+        self.connection_id = f"{WORKER_ID}/{uuid.uuid4().hex[:8]}"
+        self.stream_key = f"session:{session_id}:frames"
+        self.cursor_key = f"session:{session_id}:cursor"
+        self.owner_key = f"session:{session_id}:owner"
+        self.turn_key = f"session:{session_id}:turn"
+        self.channel = self.channel_for(session_id)
+
+    @staticmethod
+    def channel_for(session_id: str) -> str:
+        return f"session:{session_id}:events"
+
+    async def claim(self) -> Optional[str]:
+        """
+        Register this connection as the owner of the session.
+
+        A connection of the same session on any other worker is told to
+        close, its in-flight turn keeps running and publishing frames.
+
+        Returns:
+            The previous owner, if the session was connected elsewhere
+        """
+        previous = await self.redis_client.set(
+            self.owner_key, self.connection_id, ex=SESSION_OWNER_TTL, get=True
+        )
+        if previous and previous != self.connection_id:
+            await self.redis_client.publish(
+                self.channel, json.dumps({"takeover": self.connection_id})
+            )
+            logger.info(
+                "Session resumed from %s",
+                previous,
+                extra={"session_id": self.session_id},
+            )
+        return previous
+
+    async def next_turn(self) -> int:
+        """
+        Allocate a turn id that is unique across the session's connections.
+
+        Turns of a previous connection may still be publishing to the same
+        stream, so per-connection counters would collide.
+        """
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.incr(self.turn_key)
+            pipe.expire(self.turn_key, SESSION_STREAM_TTL)
+            turn_id, _ = await pipe.execute()
+        return turn_id
+
+    async def keep_ownership(self) -> None:
+        """Refresh the owner key on a timer until cancelled."""
+        while True:
+            await asyncio.sleep(SESSION_OWNER_TTL / 3)
+            try:
+                await self.hub.refresh_script(
+                    keys=[self.owner_key], args=[self.connection_id, SESSION_OWNER_TTL]
+                )
+            except Exception as e:
+                logger.warning(
+                    "Error refreshing session owner: %s",
+                    e,
+                    extra={"session_id": self.session_id},
+                )
+
+    async def release(self) -> None:
+        """Give up ownership unless another connection already took over."""
+        await self.hub.release_script(
+            keys=[self.owner_key], args=[self.connection_id]
+        )
+
+    async def send_json(self, data: Dict[str, Any]) -> None:
+        await self._publish({"json": data})
+
+    async def send_text(self, text: str) -> None:
+        await self._publish({"text": text})
+
+    async def _publish(self, frame: Dict[str, Any]) -> None:
+        await self.hub.publish_script(
+            keys=[self.stream_key, self.channel],
+            args=[SESSION_STREAM_MAXLEN, json.dumps(frame), SESSION_STREAM_TTL],
+        )
+
+    async def _undelivered(self, after: str) -> List[Tuple[str, Dict[str, Any]]]:
+        entries = await self.redis_client.xrange(self.stream_key, min=f"({after}")
+        return [(frame_id, json.loads(fields["frame"])) for frame_id, fields in entries]
+
+    async def frames(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield the frames to deliver to this connection, oldest first.
+
+        Starts with frames published since the last acknowledged one, such as
+        the rest of a reply produced while the client was reconnecting, then
+        follows new frames live. A replay that starts in the middle of a
+        streamed reply is preceded by a fresh "start" frame for that turn, so
+        the client drops the chunks it already rendered before the reconnect.
+        Ownership is refreshed while the connection lasts. Ends when another
+        connection takes over the session.
+        """
+        queue = await self.hub.subscribe(self.session_id)
+        refresher = asyncio.create_task(self.keep_ownership())
+        try:
+            # Subscribed before reading the backlog, so nothing falls in between
+            cursor = await self.redis_client.get(self.cursor_key) or "0-0"
+            position = _stream_position(cursor)
+            backlog = await self._undelivered(cursor)
+            started_turns = set()
+            for frame_id, frame in backlog:
+                position = _stream_position(frame_id)
+                message = frame.get("json", {})
+                if message.get("type") == "start":
+                    started_turns.add(message["turn"])
+                elif message.get("type") == "chunk":
+                    if message["turn"] not in started_turns:
+                        started_turns.add(message["turn"])
+                        yield {"json": {"type": "start", "turn": message["turn"]}}
+                yield frame
+            if backlog:
+                await self.ack(backlog[-1][0])
+
+            while True:
+                message = await queue.get()
+                if "takeover" in message:
+                    if message["takeover"] != self.connection_id:
+                        return
+                    continue
+
+                frame_position = _stream_position(message["id"])
+                if frame_position <= position:
+                    continue  # Already replayed from the stream
+                position = frame_position
+                yield message["frame"]
+                # Acknowledge complete messages; a reconnect mid-reply
+                # replays the reply from its first unacknowledged chunk
+                if message["frame"].get("json", {}).get("type") != "chunk":
+                    await self.ack(message["id"])
+        finally:
+            refresher.cancel()
+            await self.hub.unsubscribe(self.session_id, queue)
+
+    async def ack(self, frame_id: str) -> None:
+        """Record that the client received everything up to frame_id."""
+        await self.redis_client.set(self.cursor_key, frame_id, ex=SESSION_STREAM_TTL)
@@ -1,15 +1,215 @@
-from datetime import datetime, timedelta
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict
 
-from database import Booking, DbSession
-from sqlmodel import select
+from availability_cache import create_availability_cache, hours_to_mask, mask_to_hours
+from database import (
+    DB_SYNC_POOL_SIZE,
+    Booking,
+    DbSession,
+    async_engine,
+    engine,
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import Integer, cast, extract, func, literal
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+# Process-wide booked-slot bitmaps, None when disabled
+availability_cache = create_availability_cache()
 
-def check_availability(db: DbSession, date_str: str) -> str:
+# Longest span check_availability_range answers in one call
+MAX_RANGE_DAYS = 31
+
+# Bounded pool for the sync tools when the async engine is disabled
+sync_tool_pool = ThreadPoolExecutor(
+    max_workers=DB_SYNC_POOL_SIZE, thread_name_prefix="db-tool"
+)
+
+
+def _bookings_on(target_date: date):
+    """Select the start times of all bookings on a date."""
+    return select(Booking.start_time).where(
+        Booking.start_time >= datetime.combine(target_date, datetime.min.time()),
+        Booking.start_time
+        < datetime.combine(target_date + timedelta(days=1), datetime.min.time()),
+    )
+
+
+def _insert_bookings(dialect_name: str, user_name: str, start_times: list[datetime]):
+    """
+    Insert several bookings in one statement, skipping slots that are taken.
+
+    Returns (id, start_time) for every inserted row, so the caller can tell
+    which slots conflicted and roll back for all-or-nothing semantics.
+    """
+    insert = postgresql_insert if dialect_name == "postgresql" else sqlite_insert
+    created_at = datetime.now()
+    return (
+        insert(Booking)
+        .values(
+            [
+                {
+                    "user_name": user_name,
+                    "start_time": start_time,
+                    "created_at": created_at,
+                }
+                for start_time in start_times
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=["start_time"])
+        .returning(Booking.id, Booking.start_time)
+    )
+
+
+def _booked_masks_between(start_date: date, end_date: date):
+    """
+    Select one row per booked day in [start_date, end_date] with its mask.
+
+    Start times are unique, so summing 1 << (hour - 9) per day yields the
+    same 8-bit mask the availability cache uses.
+    """
+    day = func.date(Booking.start_time)
+    slot_bit = literal(1).op("<<")(
+        cast(extract("hour", Booking.start_time), Integer) - 9
+    )
+    return (
+        select(day, func.sum(slot_bit))
+        .where(
+            Booking.start_time >= datetime.combine(start_date, datetime.min.time()),
+            Booking.start_time
+            < datetime.combine(end_date + timedelta(days=1), datetime.min.time()),
+        )
+        .group_by(day)
+    )
+
+
+def _insert_booking(dialect_name: str, user_name: str, start_time: datetime):
+    """
+    Insert a booking unless the slot is taken, returning the new id.
+
+    A single INSERT ... ON CONFLICT (start_time) DO NOTHING RETURNING id, so
+    the conflict check and the insert cannot race. No row means the slot is
+    already booked. Supports PostgreSQL and SQLite (3.35+).
+    """
+    insert = postgresql_insert if dialect_name == "postgresql" else sqlite_insert
+    return (
+        insert(Booking)
+        .values(user_name=user_name, start_time=start_time, created_at=datetime.now())
+        .on_conflict_do_nothing(index_elements=["start_time"])
+        .returning(Booking.id)
+    )
+
+
+def _format_availability(date_str: str, booked_mask: int) -> str:
+    """Describe the free slots of a date given its booked-slot mask."""
+    # All possible 1 hour slots
+    all_hours = list(range(9, 17))
+
+    # Mark booked hours
+    booked_hours = set(mask_to_hours(booked_mask))
+
+    # Available = all hours - booked hours
+    available_hours = [h for h in all_hours if h not in booked_hours]
+
+    if not available_hours:
+        return f"No slots available on {date_str}. All hours from 9 AM to 5 PM are booked."
+
+    # Format available hours
+    available_slots = [f"{h}:00-{h + 1}:00" for h in available_hours]
+    return f"Available slots on {date_str}: {', '.join(available_slots)}"
+
+
+def _parse_range(start_date: str, end_date: str) -> tuple[date, date] | str:
+    """Parse and validate a date range, returning an error message if invalid."""
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        return "Invalid date format. Please use YYYY-MM-DD format."
+    if end < start:
+        return "Invalid range. The end date must not be before the start date."
+    if (end - start).days >= MAX_RANGE_DAYS:
+        return f"Range too long. Please check at most {MAX_RANGE_DAYS} days at a time."
+    return start, end
+
+
+def _format_range(start: date, end: date, booked_masks: Dict[date, int]) -> str:
+    """Summarize free hours per day compactly, merging consecutive slots."""
+    lines = [f"Availability from {start.isoformat()} to {end.isoformat()}:"]
+    day = start
+    while day <= end:
+        booked_hours = set(mask_to_hours(booked_masks.get(day, 0)))
+        free_hours = [h for h in range(9, 17) if h not in booked_hours]
+
+        if not free_hours:
+            summary = "fully booked"
+        elif len(free_hours) == 8:
+            summary = "all slots free (9:00-17:00)"
+        else:
+            spans = []
+            span_start = previous = free_hours[0]
+            for hour in free_hours[1:] + [None]:
+                if hour != previous + 1:
+                    spans.append(f"{span_start}:00-{previous + 1}:00")
+                    span_start = hour
+                previous = hour
+            summary = "free " + ", ".join(spans)
+
+        lines.append(f"- {day.isoformat()} ({day.strftime('%A')}): {summary}")
+        day += timedelta(days=1)
+    return "\n".join(lines)
+
+
+def _conflict_message(start_time: datetime) -> str:
+    return f"Time slot conflicts with existing booking at {start_time.strftime('%H:%M')}."
+
+
+def _parse_block(
+    date_str: str, start_hour: int, hours: int
+) -> tuple[date, list[datetime]] | str:
+    """Validate a block of consecutive slots, returning an error message if invalid."""
+    if hours < 1:
+        return "Invalid number of hours. Please book at least 1 hour."
+    if start_hour < 9 or start_hour + hours > 17:
+        return "Invalid time range. Bookings must start at 9 AM or later and end by 5 PM."
+    try:
+        target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        return "Invalid date format. Please use YYYY-MM-DD format."
+    start_times = [
+        datetime.combine(target_date, datetime.min.time().replace(hour=hour))
+        for hour in range(start_hour, start_hour + hours)
+    ]
+    return target_date, start_times
+
+
+def _block_conflict_message(conflicting: list[datetime]) -> str:
+    times = ", ".join(start_time.strftime("%H:%M") for start_time in conflicting)
+    return f"Time slots conflict with existing bookings at {times}. Nothing was booked."
+
+
+def _block_confirmation_message(
+    booking_ids: list[int], user_name: str, date_str: str, start_hour: int, hours: int
+) -> str:
+    ids = ", ".join(str(booking_id) for booking_id in booking_ids)
+    return f"✓ Booking confirmed! Confirmation IDs: {ids}. {user_name} booked {hours} consecutive slots from {start_hour}:00 to {start_hour + hours}:00 on {date_str}."
+
+
+def _confirmation_message(
+    booking_id: int | None, user_name: str, date_str: str, hour: int
+) -> str:
+    return f"✓ Booking confirmed! Confirmation ID: {booking_id}. {user_name} booked from {hour}:00 to {hour + 1}:00 on {date_str}."
+
+
+async def check_availability(db: AsyncSession, date_str: str) -> str:
     """
     Check available time slots for a given date.
 
     Args:
-        db: Database session
+        db: Async database session
         date_str: Date in format YYYY-MM-DD
 
     Returns:
@@ -18,33 +218,19 @@ def check_availability(db: DbSession, date_str: str) -> str:
     try:
         target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
-        # Get all bookings for the target date
-        bookings = db.exec(
-            select(Booking).where(
-                Booking.start_time
-                >= datetime.combine(target_date, datetime.min.time()),
-                Booking.start_time
-                < datetime.combine(
-                    target_date + timedelta(days=1), datetime.min.time()
-                ),
-            )
-        ).all()
-
-        # All possible 1 hour slots
-        all_hours = list(range(9, 17))
-
-        # Mark booked hours
-        booked_hours = {booking.start_time.hour for booking in bookings}
+        booked_mask = None
+        if availability_cache:
+            booked_mask = await availability_cache.get(target_date)
 
-        # Available = all hours - booked hours
-        available_hours = [h for h in all_hours if h not in booked_hours]
+        if booked_mask is None:
+            # Get start times of all bookings for the target date
+            start_times = (await db.exec(_bookings_on(target_date))).all()
 
-        if not available_hours:
-            return f"No slots available on {date_str}. All hours from 9 AM to 5 PM are booked."
+            booked_mask = hours_to_mask(start_time.hour for start_time in start_times)
+            if availability_cache:
+                await availability_cache.set(target_date, booked_mask)
 
-        # Format available hours
-        available_slots = [f"{h}:00-{h + 1}:00" for h in available_hours]
-        return f"Available slots on {date_str}: {', '.join(available_slots)}"
+        return _format_availability(date_str, booked_mask)
 
     except ValueError:
         return "Invalid date format. Please use YYYY-MM-DD format."
@@ -52,12 +238,14 @@ def check_availability(db: DbSession, date_str: str) -> str:
         return f"Error checking availability: {str(e)}"
 
 
-def book_slot(db: DbSession, user_name: str, date_str: str, hour: int) -> str:
+async def book_slot(
+    db: AsyncSession, user_name: str, date_str: str, hour: int
+) -> str:
     """
     Book a time slot for a user.
 
     Args:
-        db: Database session
+        db: Async database session
         user_name: Name of the user booking
         date_str: Date in format YYYY-MM-DD
         hour: Starting hour (9-16)
@@ -76,28 +264,310 @@ def book_slot(db: DbSession, user_name: str, date_str: str, hour: int) -> str:
             target_date, datetime.min.time().replace(hour=hour)
         )
 
-        # Check for already booked bookings
-        booking = db.exec(
-            select(Booking).where(Booking.start_time == start_time)
-        ).first()
+        # Create new booking unless the slot is already taken
+        result = await db.execute(
+            _insert_booking(db.get_bind().dialect.name, user_name, start_time)
+        )
+        booking_id = result.scalar_one_or_none()
+        await db.commit()
+
+        if availability_cache:
+            await availability_cache.mark_booked(target_date, hour)
 
-        if booking:
-            return f"Time slot conflicts with existing booking at {booking.start_time.strftime('%H:%M')}."
+        if booking_id is None:
+            return _conflict_message(start_time)
+
+        return _confirmation_message(booking_id, user_name, date_str, hour)
+
+    except ValueError:
+        return "Invalid date format. Please use YYYY-MM-DD format."
+    except Exception as e:
+        await db.rollback()
+        return f"Error booking slot: {str(e)}"
+
+
+async def book_slots(
+    db: AsyncSession, user_name: str, date_str: str, start_hour: int, hours: int
+) -> str:
+    """
+    Book consecutive 1-hour slots in one transaction.
+
+    Either every slot is booked or none is: if any slot is already taken the
+    insert is rolled back and the conflicting times are reported.
+
+    Args:
+        db: Async database session
+        user_name: Name of the user booking
+        date_str: Date in format YYYY-MM-DD
+        start_hour: Starting hour of the first slot (9-16)
+        hours: Number of consecutive slots
+
+    Returns:
+        Success or error message
+    """
+    parsed = _parse_block(date_str, start_hour, hours)
+    if isinstance(parsed, str):
+        return parsed
+    target_date, start_times = parsed
 
-        # Create new booking
-        new_booking = Booking(
-            user_name=user_name,
-            start_time=start_time,
+    try:
+        result = await db.execute(
+            _insert_bookings(db.get_bind().dialect.name, user_name, start_times)
+        )
+        inserted = {start_time: booking_id for booking_id, start_time in result.all()}
+        conflicting = [
+            start_time for start_time in start_times if start_time not in inserted
+        ]
+
+        if conflicting:
+            await db.rollback()
+            if availability_cache:
+                for start_time in conflicting:
+                    await availability_cache.mark_booked(target_date, start_time.hour)
+            return _block_conflict_message(conflicting)
+
+        await db.commit()
+
+        if availability_cache:
+            for start_time in start_times:
+                await availability_cache.mark_booked(target_date, start_time.hour)
+
+        booking_ids = [inserted[start_time] for start_time in start_times]
+        return _block_confirmation_message(
+            booking_ids, user_name, date_str, start_hour, hours
         )
 
-        db.add(new_booking)
+    except Exception as e:
+        await db.rollback()
+        return f"Error booking slots: {str(e)}"
+
+
+async def check_availability_range(
+    db: AsyncSession, start_date: str, end_date: str
+) -> str:
+    """
+    Summarize available slots for every day in a date range.
+
+    Runs a single grouped query for the whole range and warms the
+    availability cache for each day.
+
+    Args:
+        db: Async database session
+        start_date: First date in format YYYY-MM-DD
+        end_date: Last date (inclusive) in format YYYY-MM-DD
+
+    Returns:
+        Per-day summary of free slots
+    """
+    parsed = _parse_range(start_date, end_date)
+    if isinstance(parsed, str):
+        return parsed
+    start, end = parsed
+
+    try:
+        rows = (await db.execute(_booked_masks_between(start, end))).all()
+        booked_masks = {date.fromisoformat(str(day)[:10]): mask for day, mask in rows}
+
+        if availability_cache:
+            day = start
+            while day <= end:
+                await availability_cache.set(day, booked_masks.get(day, 0))
+                day += timedelta(days=1)
+
+        return _format_range(start, end, booked_masks)
+
+    except Exception as e:
+        return f"Error checking availability: {str(e)}"
+
+
+def check_availability_sync(db: DbSession, date_str: str) -> str:
+    """
+    Blocking variant of check_availability for the thread-pool fallback.
+
+    Only the local tier of the availability cache is used.
+
+    Args:
+        db: Database session
+        date_str: Date in format YYYY-MM-DD
+
+    Returns:
+        String describing available slots
+    """
+    try:
+        target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+
+        booked_mask = None
+        if availability_cache:
+            booked_mask = availability_cache.get_local(target_date)
+
+        if booked_mask is None:
+            start_times = db.exec(_bookings_on(target_date)).all()
+
+            booked_mask = hours_to_mask(start_time.hour for start_time in start_times)
+            if availability_cache:
+                availability_cache.set_local(target_date, booked_mask)
+
+        return _format_availability(date_str, booked_mask)
+
+    except ValueError:
+        return "Invalid date format. Please use YYYY-MM-DD format."
+    except Exception as e:
+        return f"Error checking availability: {str(e)}"
+
+
+def book_slot_sync(db: DbSession, user_name: str, date_str: str, hour: int) -> str:
+    """
+    Blocking variant of book_slot for the thread-pool fallback.
+
+    Args:
+        db: Database session
+        user_name: Name of the user booking
+        date_str: Date in format YYYY-MM-DD
+        hour: Starting hour (9-16)
+
+    Returns:
+        Success or error message
+    """
+    try:
+        if hour < 9 or hour > 16:
+            return "Invalid hour. Please choose between 9 AM (9) and 4 PM (16)."
+
+        target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        start_time = datetime.combine(
+            target_date, datetime.min.time().replace(hour=hour)
+        )
+
+        result = db.execute(
+            _insert_booking(db.get_bind().dialect.name, user_name, start_time)
+        )
+        booking_id = result.scalar_one_or_none()
         db.commit()
-        db.refresh(new_booking)
 
-        return f"✓ Booking confirmed! Confirmation ID: {new_booking.id}. {user_name} booked from {hour}:00 to {hour + 1}:00 on {date_str}."
+        if availability_cache:
+            availability_cache.mark_booked_local(target_date, hour)
+
+        if booking_id is None:
+            return _conflict_message(start_time)
+
+        return _confirmation_message(booking_id, user_name, date_str, hour)
 
     except ValueError:
         return "Invalid date format. Please use YYYY-MM-DD format."
     except Exception as e:
         db.rollback()
         return f"Error booking slot: {str(e)}"
+
+
+def book_slots_sync(
+    db: DbSession, user_name: str, date_str: str, start_hour: int, hours: int
+) -> str:
+    """
+    Blocking variant of book_slots for the thread-pool fallback.
+
+    Args:
+        db: Database session
+        user_name: Name of the user booking
+        date_str: Date in format YYYY-MM-DD
+        start_hour: Starting hour of the first slot (9-16)
+        hours: Number of consecutive slots
+
+    Returns:
+        Success or error message
+    """
+    parsed = _parse_block(date_str, start_hour, hours)
+    if isinstance(parsed, str):
+        return parsed
+    target_date, start_times = parsed
+
+    try:
+        result = db.execute(
+            _insert_bookings(db.get_bind().dialect.name, user_name, start_times)
+        )
+        inserted = {start_time: booking_id for booking_id, start_time in result.all()}
+        conflicting = [
+            start_time for start_time in start_times if start_time not in inserted
+        ]
+
+        if conflicting:
+            db.rollback()
+            if availability_cache:
+                for start_time in conflicting:
+                    availability_cache.mark_booked_local(target_date, start_time.hour)
+            return _block_conflict_message(conflicting)
+
+        db.commit()
+
+        if availability_cache:
+            for start_time in start_times:
+                availability_cache.mark_booked_local(target_date, start_time.hour)
+
+        booking_ids = [inserted[start_time] for start_time in start_times]
+        return _block_confirmation_message(
+            booking_ids, user_name, date_str, start_hour, hours
+        )
+
+    except Exception as e:
+        db.rollback()
+        return f"Error booking slots: {str(e)}"
+
+
+def check_availability_range_sync(
+    db: DbSession, start_date: str, end_date: str
+) -> str:
+    """
+    Blocking variant of check_availability_range for the thread-pool fallback.
+
+    Args:
+        db: Database session
+        start_date: First date in format YYYY-MM-DD
+        end_date: Last date (inclusive) in format YYYY-MM-DD
+
+    Returns:
+        Per-day summary of free slots
+    """
+    parsed = _parse_range(start_date, end_date)
+    if isinstance(parsed, str):
+        return parsed
+    start, end = parsed
+
+    try:
+        rows = db.execute(_booked_masks_between(start, end)).all()
+        booked_masks = {date.fromisoformat(str(day)[:10]): mask for day, mask in rows}
+
+        if availability_cache:
+            day = start
+            while day <= end:
+                availability_cache.set_local(day, booked_masks.get(day, 0))
+                day += timedelta(days=1)
+
+        return _format_range(start, end, booked_masks)
+
+    except Exception as e:
+        return f"Error checking availability: {str(e)}"
+
+
+async def run_tool(async_tool: Callable, sync_tool: Callable, *args) -> str:
+    """
+    Run a tool with its own database session without blocking the event loop.
+
+    Uses the async engine when enabled, otherwise runs the sync variant in
+    the bounded sync_tool_pool.
+
+    Args:
+        async_tool: Coroutine tool taking an AsyncSession first
+        sync_tool: Blocking tool taking a Session first
+        args: Remaining tool arguments
+
+    Returns:
+        String result from the tool
+    """
+    if async_engine is not None:
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            return await async_tool(db, *args)
+
+    def call_sync() -> str:
+        with Session(engine) as db:
+            return sync_tool(db, *args)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(sync_tool_pool, call_sync)
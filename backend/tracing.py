@@ -0,0 +1,181 @@
+import os
+from typing import Any, Optional
+
+from logs import get_logger
+from sqlalchemy import event
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import (
+        BatchSpanProcessor,
+        ConsoleSpanExporter,
+        SimpleSpanProcessor,
+    )
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+except ImportError:  # Tracing is an optional extra
+    trace = None
+
+# Standard OpenTelemetry variable; "memory" keeps spans in-process for tests
+TRACES_EXPORTER = os.getenv("OTEL_TRACES_EXPORTER", "none").lower()
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ai-booking-agent")
+
+logger = get_logger("tracing")
+
+
+class _NoopSpan:
+    """Stand-in span used when OpenTelemetry is not installed."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, exception: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+class _NoopTracer:
+    def start_as_current_span(self, name: str, **kwargs) -> _NoopSpan:
+        return _NoopSpan()
+
+    def start_span(self, name: str, **kwargs) -> _NoopSpan:
+        return _NoopSpan()
+
+
+# Until configure_tracing installs a provider this records nothing
+tracer = trace.get_tracer("booking-agent") if trace else _NoopTracer()
+
+_provider = None
+_exporter = None
+
+
+def configure_tracing(*engines) -> Optional[Any]:
+    """
+    Install the tracer provider and instrument SQL statements.
+
+    Only the first call does anything; later calls, e.g. from a second app
+    lifespan in tests, return the exporter installed by the first.
+
+    Args:
+        engines: SQLAlchemy engines (sync or async) whose statements get spans
+
+    Returns:
+        The span exporter, e.g. an InMemorySpanExporter to inspect in tests,
+        or None if tracing is disabled or OpenTelemetry is not installed
+    """
+    global _provider, _exporter
+
+    if _provider is not None:
+        return _exporter
+    if TRACES_EXPORTER == "none" or trace is None:
+        return None
+
+    if TRACES_EXPORTER == "memory":
+        exporter = InMemorySpanExporter()
+        processor = SimpleSpanProcessor(exporter)
+    elif TRACES_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+        processor = BatchSpanProcessor(exporter)
+    elif TRACES_EXPORTER == "otlp":
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        exporter = OTLPSpanExporter()
+        processor = BatchSpanProcessor(exporter)
+    else:
+        logger.warning("Unknown exporter %r, tracing disabled", TRACES_EXPORTER)
+        return None
+
+    _provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    _provider.add_span_processor(processor)
+    _exporter = exporter
+    trace.set_tracer_provider(_provider)
+
+    for engine in engines:
+        if engine is not None:
+            instrument_engine(engine)
+
+    logger.info("Exporting spans to %s", TRACES_EXPORTER)
+    return exporter
+
+
+def get_span_exporter() -> Optional[Any]:
+    """
+    Return the exporter installed by configure_tracing.
+
+    With OTEL_TRACES_EXPORTER=memory this is the InMemorySpanExporter whose
+    finished spans tests can inspect; None if tracing is not configured.
+    """
+    return _exporter
+
+
+def shutdown_tracing() -> None:
+    """Flush pending spans."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def instrument_engine(engine) -> None:
+    """
+    Open a span around every SQL statement executed by an engine.
+
+    Args:
+        engine: SQLAlchemy Engine or AsyncEngine
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    db_system = sync_engine.dialect.name
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start_span(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.start_span("db.query")
+        span.set_attribute("db.system", db_system)
+        span.set_attribute("db.statement", statement)
+        context._tracing_span = span
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _end_span(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_tracing_span", None)
+        if span is not None:
+            span.end()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _fail_span(exception_context):
+        context = exception_context.execution_context
+        span = getattr(context, "_tracing_span", None) if context else None
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            span.end()
+
+
+def record_usage(span, response) -> None:
+    """
+    Copy Gemini token counts onto a span.
+
+    Args:
+        span: Span of the model call
+        response: GenerateContentResponse (or last stream chunk) with usage
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return
+    if usage.prompt_token_count is not None:
+        span.set_attribute("gen_ai.usage.input_tokens", usage.prompt_token_count)
+    if usage.candidates_token_count is not None:
+        span.set_attribute("gen_ai.usage.output_tokens", usage.candidates_token_count)
+    if usage.cached_content_token_count is not None:
+        span.set_attribute(
+            "gen_ai.usage.cached_tokens", usage.cached_content_token_count
+        )
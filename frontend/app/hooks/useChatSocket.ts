@@ -5,8 +5,36 @@ import { useState, useEffect, useCallback, useRef } from "react";
 export interface Message {
     role: 'user' | 'agent';
     text: string;
+    // Set while the agent's reply is still being streamed
+    turnId?: number;
+    streaming?: boolean;
 }
 
+// Streaming frames sent by the backend; anything else is a complete plain-text message
+interface StreamFrame {
+    type: 'start' | 'chunk' | 'end';
+    turn: number;
+    text?: string;
+}
+
+function parseStreamFrame(data: string): StreamFrame | null {
+    if (!data.startsWith('{')) {
+        return null;
+    }
+    try {
+        const frame = JSON.parse(data);
+        if (typeof frame?.type === 'string' && typeof frame?.turn === 'number') {
+            return frame as StreamFrame;
+        }
+    } catch {
+        // Not a frame, treat as plain text
+    }
+    return null;
+}
+
+// Close code sent when the same session connects again elsewhere
+const SESSION_TAKEN_OVER = 4000;
+
 export function useChatSocket(wsUrl: string, sessionId: string) {
     const [messages, setMessages] = useState<Message[]>([]);
     const [isConnected, setIsConnected] = useState(false);
@@ -35,10 +63,36 @@ export function useChatSocket(wsUrl: string, sessionId: string) {
         ws.onmessage = (event) => {
             try {
                 const agentMessage = event.data;
-
-                // add agent's response to messages
-                setMessages((prev) => [...prev, { role: 'agent', text: agentMessage }]);
-                setIsLoading(false);
+                const frame = parseStreamFrame(agentMessage);
+
+                if (!frame) {
+                    // add agent's response to messages
+                    setMessages((prev) => [...prev, { role: 'agent', text: agentMessage }]);
+                    setIsLoading(false);
+                    return;
+                }
+
+                if (frame.type === 'start') {
+                    // a new turn replaces any partial reply from a cancelled turn
+                    setMessages((prev) => prev.filter((m) => !m.streaming));
+                } else if (frame.type === 'chunk') {
+                    // append to the current agent bubble, creating it on the first chunk
+                    setMessages((prev) => {
+                        const index = prev.findIndex((m) => m.streaming && m.turnId === frame.turn);
+                        if (index === -1) {
+                            return [...prev, { role: 'agent', text: frame.text ?? '', turnId: frame.turn, streaming: true }];
+                        }
+                        const updated = [...prev];
+                        updated[index] = { ...updated[index], text: updated[index].text + (frame.text ?? '') };
+                        return updated;
+                    });
+                    setIsLoading(false);
+                } else if (frame.type === 'end') {
+                    setMessages((prev) =>
+                        prev.map((m) => (m.turnId === frame.turn ? { ...m, streaming: false } : m))
+                    );
+                    setIsLoading(false);
+                }
             } catch (error) {
                 console.error('Error parsing message:', error);
                 setIsLoading(false);
@@ -51,13 +105,19 @@ export function useChatSocket(wsUrl: string, sessionId: string) {
             setIsLoading(false);
         };
 
-        ws.onclose = () => {
+        ws.onclose = (event) => {
             console.log('WebSocket disconnected');
             setIsConnected(false);
             setIsConnecting(false);
             setIsLoading(false);
             wsRef.current = null;
 
+            // The session was resumed on another connection (e.g. another tab)
+            if (event.code === SESSION_TAKEN_OVER) {
+                console.log('Session resumed elsewhere, not reconnecting');
+                return;
+            }
+
             // Auto-reconnect with exponential backoff
             if (reconnectAttemptsRef.current < maxReconnectAttempts) {
                 const delay = Math.min(1000 * Math.pow(2, reconnectAttemptsRef.current), 10000);